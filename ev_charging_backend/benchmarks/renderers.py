@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Compare API renderers on large station and payment list payloads.
+
+Usage: python benchmarks/renderers.py [--rows 5000] [--repeat 20]
+
+Payloads come from the real serializers over unsaved model instances, so no
+database is needed and the numbers isolate rendering cost.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ev_charging_backend.settings.development')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from ev_charging_backend.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson  # noqa: E402
+from payments.models import Payment  # noqa: E402
+from payments.serializers import PaymentSerializer  # noqa: E402
+from stations.models import ChargingStation  # noqa: E402
+from stations.serializers import ChargingStationSerializer  # noqa: E402
+
+
+def station_payload(rows):
+    now = timezone.now()
+    stations = []
+    for i in range(rows):
+        station = ChargingStation(
+            id=i + 1, name=f'Station {i}', address=f'{i} Boulevard Zerktouni, Casablanca',
+            latitude=Decimal('33.58920000') + Decimal(i) / 100000,
+            longitude=Decimal('-7.62610000') - Decimal(i) / 100000,
+            status='active', charger_type='ccs', power_rating=50,
+            price_per_kwh=Decimal('3.200'), total_ports=4, available_ports=2,
+            amenities=['parking', 'wifi'], geohash='evdxq1234', rating_sum=40, rating_count=10,
+            created_at=now, updated_at=now,
+        )
+        station.recent_review_list = []
+        stations.append(station)
+    return ChargingStationSerializer(stations, many=True).data
+
+
+def payment_payload(rows):
+    now = timezone.now()
+    payments = [
+        Payment(
+            id=uuid.uuid4(), amount=Decimal('125.50'), currency='MAD', payment_method='card',
+            status='completed', transaction_id=f'TXN-{i:08X}', created_at=now - timedelta(minutes=i),
+        )
+        for i in range(rows)
+    ]
+    return PaymentSerializer(payments, many=True).data
+
+
+def measure(renderer, data, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = renderer.render(data)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    renderers = [('stdlib JSONRenderer', JSONRenderer())]
+    if orjson is not None:
+        renderers.append(('ORJSONRenderer', ORJSONRenderer()))
+    if msgpack is not None:
+        renderers.append(('MessagePackRenderer', MessagePackRenderer()))
+
+    for label, data in [('stations', station_payload(args.rows)), ('payments', payment_payload(args.rows))]:
+        print(f'\n{label}: {args.rows} rows, best of {args.repeat}')
+        baseline = None
+        for name, renderer in renderers:
+            elapsed, size = measure(renderer, data, args.repeat)
+            baseline = baseline or elapsed
+            print(f'  {name:<22} {elapsed:8.2f} ms  {size / 1024:8.1f} KiB  {baseline / elapsed:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# ev_charging_backend/idempotency.py - Replay responses for retried POSTs
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# How long a first request may run before a retry is allowed to start over
+IN_PROGRESS_TIMEOUT = 60
+
+
+def _config():
+    return {'CACHE': 'default', 'TTL': 60 * 60 * 24, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def _fingerprint(data):
+    if hasattr(data, 'lists'):  # QueryDict from form posts
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Honour an ``Idempotency-Key`` header on ``create``.
+
+    The first request with a key runs normally and its response is kept
+    for the configured TTL, scoped to the user and endpoint. Retries with
+    the same key and body get that response back without touching the
+    database; a retry arriving while the first is still running gets 409,
+    and reusing a key for a different body gets 422. 5xx responses are not
+    stored so the client can retry them.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        config = _config()
+        cache = caches[config['CACHE']]
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        cache_key = f'idempotency:{self.basename}:{request.user.pk}:{digest}'
+        fingerprint = _fingerprint(request.data)
+
+        # add() is atomic, so only one of several concurrent retries gets to run
+        if not cache.add(cache_key, {'fingerprint': fingerprint, 'response': None}, IN_PROGRESS_TIMEOUT):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    return Response({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if stored['response'] is None:
+                    return Response({'error': 'A request with this key is still being processed'},
+                                    status=status.HTTP_409_CONFLICT)
+                status_code, data, headers = stored['response']
+                return Response(data, status=status_code, headers={**headers, 'Idempotent-Replayed': 'true'})
+            # Evicted between add() and get(): treat as a first request
+            cache.set(cache_key, {'fingerprint': fingerprint, 'response': None}, IN_PROGRESS_TIMEOUT)
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            headers = {name: response[name] for name in ('Location',) if response.has_header(name)}
+            cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'response': (response.status_code, response.data, headers),
+            }, config['TTL'])
+        return response
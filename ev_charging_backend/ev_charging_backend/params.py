@@ -0,0 +1,15 @@
+# ev_charging_backend/params.py - Query parameter parsing shared by the API
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def parse_time(value):
+    """ISO 8601 datetime or None when empty; naive values are taken as local time."""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
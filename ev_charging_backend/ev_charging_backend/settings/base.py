@@ -1,6 +1,7 @@
 # Add these missing configurations to your settings.py file
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from decouple import config
 
@@ -133,6 +134,13 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # orjson-backed JSON first so it stays the default; MessagePack is only
+    # offered when the msgpack package is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'ev_charging_backend.renderers.ORJSONRenderer',
+        *(['ev_charging_backend.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # JWT Settings
@@ -159,4 +167,43 @@ CORS_ALLOW_ALL_ORIGINS = True
 CASABLANCA_CENTER = {
     'latitude': 33.5731,
     'longitude': -7.5898
-}
\ No newline at end of file
+}
+
+# The default cache holds state every worker must agree on: the station
+# catalog version behind ETags and the locator (stations.catalog), cluster
+# tiles, availability intervals and idempotency keys. LocMem is per process,
+# so it is only correct for a single process such as runserver or the tests;
+# set REDIS_URL whenever several workers serve requests. `manage.py check
+# --deploy` reports a process-local default cache.
+REDIS_URL = config('REDIS_URL', default='')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Live availability stream fan-out. LocalBackend only reaches clients on the
+# same worker; use stations.broadcast.RedisBackend with several workers.
+STATION_STREAM = {
+    'BACKEND': 'stations.broadcast.LocalBackend',
+    'OPTIONS': {},
+}
+
+# Stored responses for retried POSTs carrying an Idempotency-Key header.
+# Use a cache shared by all workers (Redis, Memcached) in production.
+IDEMPOTENCY = {
+    'CACHE': 'default',
+    'TTL': 60 * 60 * 24,
+}
+
+# Payments are created as 'processing' and charged off the request path by
+# `manage.py process_payments`. EAGER charges inline instead, for setups
+# running without a worker.
+PAYMENTS = {
+    'GATEWAY': 'payments.gateway.LocalGateway',
+    'OPTIONS': {},
+    'EAGER': False,
+}
@@ -9,4 +9,11 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
-}
\ No newline at end of file
+}
+
+# No payment worker needed locally: charge inline against an instant stub
+PAYMENTS = {
+    **PAYMENTS,
+    'OPTIONS': {'latency': (0, 0), 'failure_rate': 0, 'decline_rate': 0},
+    'EAGER': True,
+}
@@ -0,0 +1,79 @@
+# payments/gateway.py - Payment gateway clients
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or timed out; the charge may be retried."""
+
+
+class GatewayDeclined(Exception):
+    """The gateway refused the charge; retrying will not help."""
+
+    def __init__(self, response):
+        super().__init__(response.get('reason', 'declined'))
+        self.response = response
+
+
+class LocalGateway:
+    """
+    Stand-in for a card processor, for development and load testing.
+
+    Each charge sleeps for a random ``latency`` (seconds, as a (min, max)
+    pair), then fails with ``failure_rate`` probability or is declined with
+    ``decline_rate`` probability. Charges are deduplicated on their
+    idempotency key, as real processors do, so a retried charge is never
+    taken twice.
+    """
+
+    def __init__(self, latency=(0.05, 0.3), failure_rate=0.05, decline_rate=0.02, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._charges = {}
+
+    def charge(self, amount, currency, payment_method, idempotency_key):
+        with self._lock:
+            if idempotency_key in self._charges:
+                return self._charges[idempotency_key]
+            delay = self._random.uniform(*self.latency)
+            roll = self._random.random()
+        time.sleep(delay)
+        if roll < self.failure_rate:
+            raise GatewayError('Gateway timed out')
+
+        response = {
+            'gateway': 'local',
+            'reference': uuid.uuid4().hex,
+            'amount': str(amount),
+            'currency': currency,
+            'payment_method': payment_method,
+            'latency_ms': round(delay * 1000),
+        }
+        if roll < self.failure_rate + self.decline_rate:
+            raise GatewayDeclined({**response, 'status': 'declined', 'reason': 'insufficient_funds'})
+        response['status'] = 'approved'
+        with self._lock:
+            self._charges[idempotency_key] = response
+        return response
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            config = getattr(settings, 'PAYMENTS', {})
+            gateway_class = import_string(config.get('GATEWAY', 'payments.gateway.LocalGateway'))
+            _gateway = gateway_class(**config.get('OPTIONS', {}))
+        return _gateway
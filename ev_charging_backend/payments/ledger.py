@@ -0,0 +1,181 @@
+# payments/ledger.py - Append-only ledger with incrementally maintained balances
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, Exists, F, IntegerField, Max, OuterRef, Q, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import LedgerEntry, Payment, Refund, StationBalance, UserBalance
+
+# Balance column each entry type folds into, with the sign that makes it positive
+COUNTERS = {'charge': ('charged', 1), 'refund': ('refunded', -1), 'adjustment': ('adjusted', 1)}
+# Payments the customer has been charged for
+CHARGED_STATUSES = ['completed', 'refunded']
+
+
+def payment_station_id(payment):
+    reservation = payment.reservation or payment.archived_reservation
+    return reservation.station_id if reservation else None
+
+
+def refundable_amount(payment):
+    """
+    What can still be refunded: the charge booked in the ledger (the payment
+    amount for payments charged before the ledger) less completed refunds.
+    """
+    charged = LedgerEntry.objects.filter(payment=payment, entry_type='charge').values_list('amount', flat=True).first()
+    refunded = Refund.objects.filter(payment=payment, status='completed').aggregate(total=Sum('amount'))['total']
+    return (payment.amount if charged is None else charged) - (refunded or 0)
+
+
+def charge_entry(payment, station_id):
+    return LedgerEntry(
+        entry_type='charge', user_id=payment.user_id, station_id=station_id, payment_id=payment.pk,
+        amount=payment.amount, currency=payment.currency,
+    )
+
+
+def refund_entry(refund, payment, station_id):
+    return LedgerEntry(
+        entry_type='refund', user_id=payment.user_id, station_id=station_id, payment_id=payment.pk,
+        refund_id=refund.pk, amount=-Decimal(str(refund.amount)), currency=payment.currency, memo=refund.reason,
+    )
+
+
+def _fold(model, owner, entries):
+    """Add entries to ``model`` snapshots: one insert for new owners, one UPDATE for all."""
+    deltas = defaultdict(lambda: {'charged': 0, 'refunded': 0, 'adjusted': 0, 'entries': 0, 'last_entry_id': 0})
+    for entry in entries:
+        counter, sign = COUNTERS[entry.entry_type]
+        delta = deltas[(getattr(entry, owner), entry.currency)]
+        delta[counter] += sign * entry.amount
+        delta['entries'] += 1
+        delta['last_entry_id'] = max(delta['last_entry_id'], entry.pk or 0)
+    if not deltas:
+        return
+
+    model.objects.bulk_create(
+        [model(**{owner: owner_id, 'currency': currency}) for owner_id, currency in deltas],
+        ignore_conflicts=True,
+    )
+
+    def per_owner(field, output_field):
+        return Case(
+            *[When(**{owner: owner_id, 'currency': currency}, then=Value(delta[field]))
+              for (owner_id, currency), delta in deltas.items()],
+            default=Value(0),
+            output_field=output_field,
+        )
+
+    money = DecimalField(max_digits=12, decimal_places=2)
+    model.objects.filter(
+        reduce(or_, (Q(**{owner: owner_id, 'currency': currency}) for owner_id, currency in deltas))
+    ).update(
+        charged=F('charged') + per_owner('charged', money),
+        refunded=F('refunded') + per_owner('refunded', money),
+        adjusted=F('adjusted') + per_owner('adjusted', money),
+        entries=F('entries') + per_owner('entries', IntegerField()),
+        last_entry_id=Greatest(Coalesce(F('last_entry_id'), 0), per_owner('last_entry_id', IntegerField())),
+        updated_at=timezone.now(),
+    )
+
+
+def record(entries):
+    """
+    Append ledger entries and fold them into the per-user and per-station
+    balances in the same transaction, in a fixed number of queries however
+    many entries and owners are involved. Balances are updated with F()
+    increments, so concurrent writers never lose each other's totals.
+    """
+    if not entries:
+        return []
+    with transaction.atomic():
+        entries = LedgerEntry.objects.bulk_create(entries)
+        _fold(UserBalance, 'user_id', entries)
+        _fold(StationBalance, 'station_id', [entry for entry in entries if entry.station_id])
+    return entries
+
+
+def backfill_ledger(batch_size=1000, on_batch=None):
+    """
+    Write the entries missing for charged payments and completed refunds,
+    such as those predating the ledger, and fold them into the balances.
+    Safe to re-run: only rows without an entry are read.
+    """
+    station = Coalesce('reservation__station_id', 'archived_reservation__station_id')
+    charges = Payment.objects.filter(status__in=CHARGED_STATUSES).exclude(
+        Exists(LedgerEntry.objects.filter(payment=OuterRef('pk'), entry_type='charge'))
+    ).annotate(station_id=station).only('id', 'user', 'amount', 'currency')
+    refunds = Refund.objects.filter(status='completed').exclude(
+        Exists(LedgerEntry.objects.filter(refund=OuterRef('pk')))
+    ).select_related('payment').annotate(
+        station_id=Coalesce('payment__reservation__station_id', 'payment__archived_reservation__station_id')
+    )
+
+    written = 0
+    for rows, make_entry in (
+        (charges, lambda payment: charge_entry(payment, payment.station_id)),
+        (refunds, lambda refund: refund_entry(refund, refund.payment, refund.station_id)),
+    ):
+        batch = []
+        for row in rows.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(make_entry(row))
+            if len(batch) == batch_size:
+                written += len(record(batch))
+                batch = []
+                if on_batch:
+                    on_batch(written)
+        if batch:
+            written += len(record(batch))
+            if on_batch:
+                on_batch(written)
+    return written
+
+
+def rebuild_balances():
+    """
+    Recompute every balance from the ledger with one GROUP BY per owner type,
+    fix the snapshots that drifted and return how many there were. Audit
+    tool; ``record`` normally keeps the balances current.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    fields = ['charged', 'refunded', 'adjusted', 'entries', 'last_entry_id']
+    drifted = 0
+    with transaction.atomic():
+        for model, owner in ((UserBalance, 'user_id'), (StationBalance, 'station_id')):
+            current = {
+                (getattr(balance, owner), balance.currency): balance for balance in model.objects.select_for_update()
+            }
+            created, changed = [], []
+            totals = LedgerEntry.objects.filter(**{f'{owner}__isnull': False}).order_by().values(
+                owner, 'currency'
+            ).annotate(
+                **{
+                    counter: Coalesce(Sum(F('amount') * sign, filter=Q(entry_type=entry_type)), Value(0), output_field=money)
+                    for entry_type, (counter, sign) in COUNTERS.items()
+                },
+                entries=Count('id'),
+                last_entry_id=Max('id'),
+            )
+            for row in totals:
+                key = (row.pop(owner), row.pop('currency'))
+                balance = current.pop(key, None)
+                if balance is None:
+                    created.append(model(**{owner: key[0], 'currency': key[1]}, **row))
+                elif any(getattr(balance, field) != row[field] for field in fields):
+                    for field in fields:
+                        setattr(balance, field, row[field])
+                    balance.updated_at = timezone.now()
+                    changed.append(balance)
+            # Whatever is left has no entries at all
+            model.objects.filter(pk__in=[balance.pk for balance in current.values()]).delete()
+            model.objects.bulk_create(created)
+            model.objects.bulk_update(changed, fields + ['updated_at'])
+            drifted += len(created) + len(changed) + len(current)
+    return drifted
@@ -0,0 +1,24 @@
+# payments/management/commands/backfill_ledger.py
+from django.core.management.base import BaseCommand, CommandError
+from payments.ledger import backfill_ledger, rebuild_balances
+
+class Command(BaseCommand):
+    help = 'Write ledger entries missing for past payments and refunds, optionally auditing the balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Entries written per transaction')
+        parser.add_argument('--rebuild-balances', action='store_true',
+                            help='Recompute balances from the ledger and fix any that drifted')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        def on_batch(written):
+            self.stdout.write(f'{written} ledger entries written')
+
+        written = backfill_ledger(batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {written} ledger entries'))
+        if options['rebuild_balances']:
+            drifted = rebuild_balances()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt balances, {drifted} had drifted'))
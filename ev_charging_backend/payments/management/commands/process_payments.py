@@ -0,0 +1,45 @@
+# payments/management/commands/process_payments.py
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from payments.processing import PaymentProcessor
+
+class Command(BaseCommand):
+    help = 'Charge queued payments through the configured gateway with a pool of workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Gateway calls in flight at once')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between checks for new payments')
+        parser.add_argument('--once', action='store_true', help='Exit once nothing is due')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['poll'] <= 0:
+            raise CommandError('--workers and --poll must be positive')
+
+        counts = {'completed': 0, 'refunded': 0, 'failed': 0, 'processing': 0}
+
+        def on_processed(payment_id, outcome):
+            counts[outcome] += 1
+            if outcome != 'processing' or options['verbosity'] > 1:
+                self.stdout.write(f'{timezone.now():%Y-%m-%d %H:%M:%S} payment {payment_id} {outcome}')
+
+        def on_error(exc):
+            self.stderr.write(f'Payment worker error: {exc}')
+
+        processor = PaymentProcessor(
+            workers=options['workers'],
+            poll=options['poll'],
+            on_processed=on_processed,
+            on_error=on_error,
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: processor.stop())
+
+        self.stdout.write(f'Payment processor started with {options["workers"]} workers')
+        processor.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Payment processor stopped: {counts["completed"]} completed, {counts["refunded"]} refunded, '
+            f'{counts["failed"]} failed, '
+            f'{counts["processing"]} to retry'
+        ))
@@ -0,0 +1,63 @@
+# payments/management/commands/reconcile_payments.py
+import csv
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from payments.reconciliation import (
+    MISMATCH_FIELDS, SETTLEMENT_FORMATS, SettlementError,
+    ledger_transactions, read_settlement, reconcile, settled_transactions,
+)
+
+class Command(BaseCommand):
+    help = 'Match settled payments and refunds against a gateway settlement file sorted by transaction_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('settlement', help='Settlement CSV or NDJSON file, sorted by transaction_id')
+        parser.add_argument('--format', choices=SETTLEMENT_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='Only payments created on this day (YYYY-MM-DD)')
+        parser.add_argument('--output', help='Write mismatches to this CSV file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Payments fetched per database round trip')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        created_from = created_to = None
+        if options['date']:
+            created_from = timezone.make_aware(datetime.datetime.combine(options['date'], datetime.time.min))
+            created_to = created_from + datetime.timedelta(days=1)
+
+        try:
+            output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        except OSError as exc:
+            raise CommandError(f'Cannot write mismatches: {exc}')
+        try:
+            writer = csv.DictWriter(output, fieldnames=MISMATCH_FIELDS)
+            writer.writeheader()
+            result = reconcile(
+                ledger_transactions(created_from, created_to, chunk_size=options['chunk_size']),
+                settled_transactions(read_settlement(options['settlement'], options['format'])),
+                on_mismatch=writer.writerow,
+            )
+        except OSError as exc:
+            raise CommandError(f'Cannot read settlement file: {exc}')
+        except SettlementError as exc:
+            raise CommandError(f'Invalid settlement file: {exc}')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        for currency, totals in result['currencies'].items():
+            self.stderr.write(
+                f"{currency}: expected {totals['ledger_amount']} charged / {totals['ledger_refunded']} refunded, "
+                f"settled {totals['settled_amount']} / {totals['settled_refunded']}, "
+                f"{totals['matched']} matched, {totals['mismatched']} mismatched"
+            )
+        summary = (
+            f"Reconciled {result['ledger_rows']} payments against {result['settled_rows']} settled transactions "
+            f"in {result['duration_ms']}ms ({result['rows_per_second']} rows/s): "
+            f"{result['matched']} matched, {result['mismatched']} mismatched"
+        )
+        self.stderr.write(self.style.SUCCESS(summary) if not result['mismatched'] else self.style.WARNING(summary))
@@ -0,0 +1,28 @@
+# payments/management/commands/rollup_revenue.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from payments.revenue import refresh_revenue
+
+class Command(BaseCommand):
+    help = 'Fold ledger entries appended since the last run into the daily revenue rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Ledger entries folded per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        started = time.monotonic()
+
+        def on_batch(folded):
+            self.stdout.write(f'{folded} ledger entries folded')
+
+        result = refresh_revenue(batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Folded {result['folded']} ledger entries in {time.monotonic() - started:.1f}s, "
+                f"watermark now entry {result['position']}"
+            )
+        )
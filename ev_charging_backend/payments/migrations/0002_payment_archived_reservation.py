@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0001_initial"),
+        ("reservations", "0004_archivedreservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="archived_reservation",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payment",
+                to="reservations.archivedreservation",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0002_payment_archived_reservation"),
+        ("reservations", "0005_user_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="payment_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0005_ledger"),
+        ("stations", "0005_chargingstation_external_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRevenueRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("charger_type", models.CharField(blank=True, max_length=20)),
+                ("payment_method", models.CharField(blank=True, max_length=20)),
+                ("currency", models.CharField(default="MAD", max_length=3)),
+                (
+                    "gross",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "refunded",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "adjusted",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("charges", models.PositiveIntegerField(default=0)),
+                ("refunds", models.PositiveIntegerField(default=0)),
+                (
+                    "station",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="revenue_rollups",
+                        to="stations.chargingstation",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "payment_daily_revenue",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "station", "payment_method", "currency"),
+                        name="daily_revenue_bucket",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0006_daily_revenue"),
+        ("reservations", "0007_watermark_position"),
+        ("stations", "0005_chargingstation_external_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ledgerentry",
+            name="payment",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="ledger_entries",
+                to="payments.payment",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ledgerentry",
+            name="refund",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="ledger_entry",
+                to="payments.refund",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ledgerentry",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="ledger_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="reservation",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="reservations.reservation",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stationbalance",
+            name="station",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="balances",
+                to="stations.chargingstation",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userbalance",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="balances",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
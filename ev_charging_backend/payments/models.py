@@ -1,7 +1,8 @@
 # payments/models.py - Complete Payment model
 from django.db import models
 from django.contrib.auth.models import User
-from reservations.models import Reservation
+from reservations.models import ArchivedReservation, Reservation
+from stations.models import ChargingStation
 import uuid
 
 class Payment(models.Model):
@@ -21,19 +22,34 @@ class Payment(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE, null=True, blank=True)
+    # Kept when the reservation goes: payments and their ledger entries are financial records
+    reservation = models.OneToOneField(Reservation, on_delete=models.SET_NULL, null=True, blank=True)
+    # Set instead of ``reservation`` once the reservation has been archived
+    archived_reservation = models.OneToOneField(
+        ArchivedReservation, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment'
+    )
     amount = models.DecimalField(max_digits=8, decimal_places=2)
     currency = models.CharField(max_length=3, default='MAD')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
     transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     payment_gateway_response = models.JSONField(default=dict, blank=True)
+    # Work queue state for payments.processing: gateway calls made so far and
+    # when the payment is next due (a lease while a worker holds it)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'payments'
         ordering = ['-created_at']
+        indexes = [
+            # Per-user listing in keyset order
+            models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created_idx'),
+            # Due payments for the processing workers
+            models.Index(fields=['status', 'next_attempt_at'], name='payment_queue_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.transaction_id:
@@ -70,125 +86,108 @@ class Refund(models.Model):
     def __str__(self):
         return f"Refund {self.id} - {self.amount} MAD"
 
-# payments/views.py - Complete payment processing
-from rest_framework import viewsets, permissions, serializers, status
-from rest_framework.response import Response
-from rest_framework.decorators import action
-from django.utils import timezone
-from .models import Payment, Refund
+class LedgerEntry(models.Model):
+    """
+    Append-only record of money moving, written alongside Payment and Refund
+    changes. Amounts are signed from the customer's side: charges are
+    positive, refunds negative, adjustments either.
+    """
+    ENTRY_TYPES = [
+        ('charge', 'Charge'),
+        ('refund', 'Refund'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    # Deleting anything the ledger refers to is refused, or history would vanish
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='ledger_entries')
+    station = models.ForeignKey(
+        ChargingStation, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    payment = models.ForeignKey(Payment, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_entries')
+    refund = models.OneToOneField(Refund, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_entry')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default='MAD')
+    memo = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
-class PaymentSerializer(serializers.ModelSerializer):
-    reservation_details = serializers.SerializerMethodField()
-    
     class Meta:
-        model = Payment
-        fields = ['id', 'reservation', 'reservation_details', 'amount', 'currency', 
-                 'payment_method', 'status', 'transaction_id', 'created_at']
-        read_only_fields = ['id', 'user', 'transaction_id', 'created_at']
-    
-    def get_reservation_details(self, obj):
-        if obj.reservation:
-            return {
-                'station_name': obj.reservation.station.name,
-                'start_time': obj.reservation.start_time,
-                'end_time': obj.reservation.end_time,
-            }
-        return None
-
-class PaymentViewSet(viewsets.ModelViewSet):
-    serializer_class = PaymentSerializer
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def get_queryset(self):
-        return Payment.objects.filter(user=self.request.user)
-    
-    def perform_create(self, serializer):
-        # Simulate payment processing
-        payment = serializer.save(
-            user=self.request.user,
-            status='completed',  # In real app, this would be 'processing' initially
-        )
-        
-        # Update reservation status to confirmed after payment
-        if payment.reservation:
-            payment.reservation.status = 'confirmed'
-            payment.reservation.save()
-    
-    @action(detail=True, methods=['post'])
-    def refund(self, request, pk=None):
-        payment = self.get_object()
-        
-        if payment.status != 'completed':
-            return Response(
-                {'error': 'Can only refund completed payments'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        reason = request.data.get('reason', 'user_request')
-        refund_amount = request.data.get('amount', payment.amount)
-        
-        refund = Refund.objects.create(
-            payment=payment,
-            reason=reason,
-            amount=refund_amount,
-            status='completed',  # Simulate instant refund
-        )
-        
-        payment.status = 'refunded'
-        payment.save()
-        
-        return Response({
-            'message': 'Refund processed successfully',
-            'refund_id': refund.id,
-            'amount': refund_amount
-        })
-
-# Create management command: reservations/management/commands/cleanup_reservations.py
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from reservations.models import Reservation
-
-class Command(BaseCommand):
-    help = 'Clean up expired reservations and update station availability'
-
-    def handle(self, *args, **options):
-        now = timezone.now()
-        
-        # Process expired reservations
-        expired_reservations = Reservation.objects.filter(
-            status__in=['pending', 'confirmed'],
-            start_time__lt=now - timedelta(minutes=15)
-        )
-        
-        for reservation in expired_reservations:
-            reservation.status = 'expired'
-            reservation.save()
-            
-            # Free up station port
-            station = reservation.station
-            if station.available_ports < station.total_ports:
-                station.available_ports += 1
-                station.save()
-        
-        # Auto-complete ended sessions
-        completed_sessions = Reservation.objects.filter(
-            status='active',
-            end_time__lt=now
-        )
-        
-        for session in completed_sessions:
-            session.status = 'completed'
-            session.save()
-            
-            # Free up station port
-            station = session.station
-            if station.available_ports < station.total_ports:
-                station.available_ports += 1
-                station.save()
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Processed {expired_reservations.count()} expired and {completed_sessions.count()} completed reservations'
-            )
-        )
\ No newline at end of file
+        db_table = 'payment_ledger'
+        ordering = ['id']
+        indexes = [
+            # Statements and audits walk one owner's entries in id order
+            models.Index(fields=['user', 'id'], name='ledger_user_idx'),
+            models.Index(fields=['station', 'id'], name='ledger_station_idx'),
+        ]
+        constraints = [
+            # At most one charge per payment, so backfills can be re-run
+            models.UniqueConstraint(
+                fields=['payment'], condition=models.Q(entry_type='charge'), name='ledger_one_charge_per_payment'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Ledger entries are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} {self.currency}"
+
+class Balance(models.Model):
+    """Running totals of an owner's ledger entries in one currency."""
+    currency = models.CharField(max_length=3, default='MAD')
+    charged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunded = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    adjusted = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    entries = models.PositiveIntegerField(default=0)
+    # Newest ledger entry folded in
+    last_entry_id = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def net(self):
+        return self.charged - self.refunded + self.adjusted
+
+class UserBalance(Balance):
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='balances')
+
+    class Meta:
+        db_table = 'payment_user_balances'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'currency'], name='user_balance_unique'),
+        ]
+
+class StationBalance(Balance):
+    station = models.ForeignKey(ChargingStation, on_delete=models.PROTECT, related_name='balances')
+
+    class Meta:
+        db_table = 'payment_station_balances'
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'currency'], name='station_balance_unique'),
+        ]
+
+class DailyRevenueRollup(models.Model):
+    """Ledger totals per local day, station, payment method and currency."""
+    day = models.DateField()
+    station = models.ForeignKey(
+        ChargingStation, on_delete=models.SET_NULL, null=True, blank=True, related_name='revenue_rollups'
+    )
+    charger_type = models.CharField(max_length=20, blank=True)
+    payment_method = models.CharField(max_length=20, blank=True)
+    currency = models.CharField(max_length=3, default='MAD')
+    gross = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunded = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    adjusted = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    charges = models.PositiveIntegerField(default=0)
+    refunds = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'payment_daily_revenue'
+        constraints = [
+            # Leads with day, so it also serves the date-range scans
+            models.UniqueConstraint(fields=['day', 'station', 'payment_method', 'currency'], name='daily_revenue_bucket'),
+        ]
@@ -0,0 +1,205 @@
+# payments/processing.py - Charge payments off the request path
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from reservations.lifecycle import transition
+from reservations.models import Reservation
+from .gateway import GatewayDeclined, GatewayError, get_gateway
+from .ledger import charge_entry, payment_station_id, record, refund_entry
+from .models import Payment, Refund
+
+# A claimed payment is hidden from other workers this long; it must outlast
+# a gateway call so a crashed worker's payment is picked up again, not a live one's
+PAYMENT_LEASE = timedelta(seconds=60)
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = timedelta(seconds=2)
+# Database errors around a charge (deadlocks, lock timeouts) are retried in
+# the worker this many times; repeating the charge itself is safe
+DATABASE_RETRIES = 5
+# Reservations that no longer need paying for, e.g. after a station was
+# reported defective while their payment was queued
+VOID_STATUSES = ['cancelled', 'expired']
+
+
+def due_payments(now):
+    return Payment.objects.filter(status='processing', next_attempt_at__lte=now)
+
+
+def claim_payments(limit, now=None):
+    """
+    Lease up to ``limit`` due payments, oldest first, and return their ids.
+
+    Rows another worker is claiming are skipped rather than waited on, so
+    several processors can share the queue.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        ids = list(
+            due_payments(now).select_for_update(skip_locked=True)
+            .order_by('next_attempt_at').values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            Payment.objects.filter(pk__in=ids).update(
+                next_attempt_at=now + PAYMENT_LEASE, attempts=F('attempts') + 1, updated_at=now,
+            )
+    return ids
+
+
+def finish_payment(payment, to_status, response):
+    """
+    Record the gateway outcome; a completed payment is booked and confirms its
+    reservation. If the reservation was cancelled while the charge was in
+    flight, the charge is refunded at once and 'refunded' is returned.
+    """
+    with transaction.atomic():
+        # Serialises with cancellations, which lock the reservation first
+        reservation_status = None
+        if payment.reservation_id:
+            reservation_status = Reservation.objects.select_for_update().filter(
+                pk=payment.reservation_id
+            ).values_list('status', flat=True).first()
+        voided = to_status == 'completed' and reservation_status in VOID_STATUSES
+        final_status = 'refunded' if voided else to_status
+        updated = Payment.objects.filter(pk=payment.pk, status='processing').update(
+            status=final_status, payment_gateway_response=response, next_attempt_at=None, updated_at=timezone.now(),
+        )
+        if updated and to_status == 'completed':
+            station_id = payment_station_id(payment)
+            entries = [charge_entry(payment, station_id)]
+            if voided:
+                refund = Refund.objects.create(
+                    payment=payment,
+                    reason='service_unavailable',
+                    amount=payment.amount,
+                    status='completed',
+                    admin_notes=f'Reservation {reservation_status} before the charge completed',
+                    processed_at=timezone.now(),
+                )
+                entries.append(refund_entry(refund, payment, station_id))
+            record(entries)
+            if reservation_status == 'pending':
+                transition(payment.reservation, ['pending'], 'confirmed')
+    return final_status if updated else None
+
+
+def charge_payment(payment_id, gateway=None):
+    """
+    Call the gateway for one leased payment. Returns the resulting status, or
+    None when the payment was no longer processing. Payments whose
+    reservation was cancelled meanwhile are voided without a charge.
+
+    Declines fail the payment straight away. Gateway errors are retried with
+    exponential backoff until ``MAX_ATTEMPTS`` calls have been made. The
+    payment id is the gateway idempotency key, so a charge repeated after a
+    lost response or an expired lease is not taken twice.
+    """
+    gateway = gateway or get_gateway()
+    payment = Payment.objects.select_related('reservation', 'archived_reservation').get(pk=payment_id)
+    if payment.status != 'processing':
+        return None
+    if payment.reservation and payment.reservation.status in VOID_STATUSES:
+        # Nothing left to pay for: void before taking any money
+        return finish_payment(payment, 'failed', {'status': 'voided', 'reason': f'reservation_{payment.reservation.status}'})
+    try:
+        response = gateway.charge(payment.amount, payment.currency, payment.payment_method, str(payment.pk))
+    except GatewayDeclined as exc:
+        return finish_payment(payment, 'failed', exc.response)
+    except GatewayError as exc:
+        error = {'status': 'error', 'error': str(exc), 'attempts': payment.attempts}
+        if payment.attempts >= MAX_ATTEMPTS:
+            return finish_payment(payment, 'failed', error)
+        now = timezone.now()
+        Payment.objects.filter(pk=payment.pk, status='processing').update(
+            next_attempt_at=now + RETRY_BACKOFF * 2 ** max(payment.attempts - 1, 0),
+            payment_gateway_response=error,
+            updated_at=now,
+        )
+        return 'processing'
+    return finish_payment(payment, 'completed', response)
+
+
+class PaymentProcessor:
+    """
+    Bounded pool of worker threads charging payments from the database queue.
+
+    The loop leases only as many due payments as there are idle workers, so
+    the backlog stays in the database where other processors can share it,
+    and throughput grows with ``workers`` while gateway calls are in flight.
+    With ``once`` the loop returns when nothing is due and the pool is idle.
+    """
+
+    def __init__(self, workers=4, poll=1.0, gateway=None, on_processed=None, on_error=None):
+        self.workers = workers
+        self.poll = poll
+        self.gateway = gateway
+        self.on_processed = on_processed
+        self.on_error = on_error
+        self.busy = 0
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+
+    def _charge(self, payment_id):
+        for attempt in range(DATABASE_RETRIES):
+            try:
+                return charge_payment(payment_id, self.gateway)
+            except DatabaseError:
+                if attempt == DATABASE_RETRIES - 1:
+                    raise
+                close_old_connections()
+                time.sleep(0.05 * 2 ** attempt)
+
+    def _work(self, payment_id):
+        try:
+            outcome = self._charge(payment_id)
+            if outcome and self.on_processed:
+                self.on_processed(payment_id, outcome)
+        except Exception as exc:
+            # The lease runs out and another attempt picks the payment up
+            if self.on_error:
+                self.on_error(exc)
+        finally:
+            connection.close()
+            with self._changed:
+                self.busy -= 1
+                self._changed.notify()
+
+    def dispatch(self, executor):
+        """Hand due payments to idle workers; returns how many were handed out."""
+        with self._changed:
+            idle = self.workers - self.busy
+        if not idle:
+            return 0
+        ids = claim_payments(idle)
+        with self._changed:
+            self.busy += len(ids)
+        for payment_id in ids:
+            executor.submit(self._work, payment_id)
+        return len(ids)
+
+    def run(self, once=False):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='payments') as executor:
+            while not self._stop.is_set():
+                try:
+                    dispatched = self.dispatch(executor)
+                except DatabaseError as exc:
+                    if self.on_error:
+                        self.on_error(exc)
+                    close_old_connections()
+                    dispatched = None  # unknown, so --once keeps going
+                with self._changed:
+                    if once and dispatched == 0 and not self.busy:
+                        break
+                    if not dispatched or self.busy == self.workers:
+                        # Until a worker frees up, or the next poll for new payments
+                        self._changed.wait(self.poll)
+
+    def stop(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify()
@@ -0,0 +1,177 @@
+# payments/reconciliation.py - Match payments against gateway settlement files
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Collate
+
+from .models import Payment, Refund
+
+# Payments the gateway has taken money for
+SETTLED_STATUSES = ['completed', 'refunded']
+SETTLEMENT_FORMATS = ['csv', 'ndjson']
+MISMATCH_FIELDS = [
+    'transaction_id', 'issue', 'currency',
+    'expected_amount', 'settled_amount', 'expected_refunded', 'settled_refunded',
+]
+ZERO = Decimal('0.00')
+
+
+class SettlementError(ValueError):
+    """The settlement file is malformed or not sorted by transaction_id."""
+
+
+def settlement_format(path):
+    return 'ndjson' if str(path).endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def read_settlement(path, file_format=None):
+    """
+    Yield settlement lines from a CSV (with a header row) or NDJSON file as
+    ``(transaction_id, type, amount, currency)``, one line at a time. ``type``
+    is 'charge' or 'refund'; lines without one are charges.
+    """
+    file_format = file_format or settlement_format(path)
+    with open(path, newline='', encoding='utf-8') as handle:
+        records = csv.DictReader(handle) if file_format == 'csv' else (
+            json.loads(line) for line in handle if line.strip()
+        )
+        for line_number, record in enumerate(records, start=1):
+            try:
+                entry_type = record.get('type') or 'charge'
+                if entry_type not in ('charge', 'refund'):
+                    raise SettlementError(f'line {line_number}: unknown type {entry_type!r}')
+                yield (
+                    str(record['transaction_id']),
+                    entry_type,
+                    Decimal(str(record['amount'])),
+                    record.get('currency') or 'MAD',
+                )
+            except (KeyError, InvalidOperation) as exc:
+                raise SettlementError(f'line {line_number}: {exc!r}') from exc
+
+
+def settled_transactions(lines):
+    """Fold consecutive lines into ``(transaction_id, currency, charged, refunded)`` per transaction."""
+    current = None
+    for transaction_id, entry_type, amount, currency in lines:
+        if current and transaction_id == current[0]:
+            current[2 if entry_type == 'charge' else 3] += amount
+            continue
+        if current:
+            yield tuple(current)
+        current = [transaction_id, currency, ZERO, ZERO]
+        current[2 if entry_type == 'charge' else 3] += amount
+    if current:
+        yield tuple(current)
+
+
+def ledger_transactions(created_from=None, created_to=None, chunk_size=2000):
+    """
+    Stream settled payments as ``(transaction_id, currency, amount, refunded)``
+    in transaction_id order, refunds summed by a correlated subquery so every
+    payment is one row.
+    """
+    refunded = Refund.objects.filter(payment=OuterRef('pk'), status='completed').order_by().values(
+        'payment'
+    ).annotate(total=Sum('amount')).values('total')
+    payments = Payment.objects.filter(status__in=SETTLED_STATUSES, transaction_id__isnull=False)
+    if created_from:
+        payments = payments.filter(created_at__gte=created_from)
+    if created_to:
+        payments = payments.filter(created_at__lt=created_to)
+    # Python compares strings by code point; make the database agree
+    ordering = Collate('transaction_id', 'C') if connection.vendor == 'postgresql' else 'transaction_id'
+    rows = payments.annotate(
+        refunded=Coalesce(Subquery(refunded), Value(ZERO), output_field=DecimalField(max_digits=10, decimal_places=2)),
+    ).order_by(ordering).values_list('transaction_id', 'currency', 'amount', 'refunded').iterator(chunk_size=chunk_size)
+    # SQLite hands back sums without their scale
+    return ((transaction_id, currency, amount, refunded.quantize(ZERO)) for transaction_id, currency, amount, refunded in rows)
+
+
+def _in_order(rows, source):
+    previous = None
+    for row in rows:
+        if previous is not None and row[0] <= previous:
+            raise SettlementError(f'{source} is not sorted by transaction_id at {row[0]}')
+        previous = row[0]
+        yield row
+
+
+def reconcile(ledger, settlement, on_mismatch=None):
+    """
+    Merge-join two transaction_id-ordered streams, holding one row of each in
+    memory. ``on_mismatch(row)`` receives a dict keyed by ``MISMATCH_FIELDS``
+    for every disagreement. Returns totals per currency and overall counts.
+    """
+    started = time.monotonic()
+    totals = defaultdict(lambda: {
+        'ledger_amount': ZERO, 'ledger_refunded': ZERO, 'settled_amount': ZERO, 'settled_refunded': ZERO,
+        'matched': 0, 'mismatched': 0,
+    })
+    counts = {'ledger_rows': 0, 'settled_rows': 0, 'matched': 0, 'mismatched': 0}
+
+    def report(transaction_id, issue, currency, expected=(None, None), settled=(None, None)):
+        counts['mismatched'] += 1
+        totals[currency]['mismatched'] += 1
+        if on_mismatch:
+            on_mismatch({
+                'transaction_id': transaction_id,
+                'issue': issue,
+                'currency': currency,
+                'expected_amount': expected[0],
+                'settled_amount': settled[0],
+                'expected_refunded': expected[1],
+                'settled_refunded': settled[1],
+            })
+
+    def count(side, row):
+        counts[f'{side}_rows'] += 1
+        totals[row[1]][f'{side}_amount'] += row[2]
+        totals[row[1]][f'{side}_refunded'] += row[3]
+
+    ledger = _in_order(ledger, 'payments')
+    settlement = _in_order(settlement, 'settlement file')
+    book = next(ledger, None)
+    settled = next(settlement, None)
+    while book or settled:
+        if book and (not settled or book[0] < settled[0]):
+            count('ledger', book)
+            report(book[0], 'missing_from_settlement', book[1], expected=book[2:])
+            book = next(ledger, None)
+        elif not book or settled[0] < book[0]:
+            count('settled', settled)
+            report(settled[0], 'unknown_transaction', settled[1], settled=settled[2:])
+            settled = next(settlement, None)
+        else:
+            count('ledger', book)
+            count('settled', settled)
+            transaction_id, currency = book[0], book[1]
+            if settled[1] != currency:
+                issue = 'currency_mismatch'
+            elif settled[2] != book[2]:
+                issue = 'amount_mismatch'
+            elif settled[3] != book[3]:
+                issue = 'refund_mismatch'
+            else:
+                issue = None
+            if issue:
+                report(transaction_id, issue, currency, expected=book[2:], settled=settled[2:])
+            else:
+                counts['matched'] += 1
+                totals[currency]['matched'] += 1
+            book = next(ledger, None)
+            settled = next(settlement, None)
+
+    duration = time.monotonic() - started
+    rows = counts['ledger_rows'] + counts['settled_rows']
+    return {
+        **counts,
+        'currencies': dict(sorted(totals.items())),
+        'duration_ms': round(duration * 1000),
+        'rows_per_second': round(rows / duration) if duration else rows,
+    }
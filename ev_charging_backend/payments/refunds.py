@@ -0,0 +1,71 @@
+# payments/refunds.py - Cancel and refund every upcoming booking at a station
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from reservations.models import Reservation
+from reservations.signals import reservations_changed
+from stations.ports import release_ports
+from .ledger import refund_entry, record
+from .models import Payment, Refund
+
+# Bookings that have not started yet; active sessions are left to finish
+REFUNDABLE_STATUSES = ['pending', 'confirmed']
+
+
+def refund_batch(station_id, reason, batch_size):
+    """
+    Cancel up to ``batch_size`` upcoming reservations at a station and refund
+    their completed payments, in one transaction and a fixed number of
+    queries. Returns ``(cancelled, refunded, amount)``.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Reservation.objects.select_for_update()
+            .filter(station_id=station_id, status__in=REFUNDABLE_STATUSES)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0, Decimal('0')
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(reservation_id__in=ids, status='completed')
+            .only('id', 'user', 'amount', 'currency')
+        )
+        Reservation.objects.filter(pk__in=ids).update(status='cancelled', updated_at=now)
+        refunds = Refund.objects.bulk_create([
+            Refund(payment=payment, reason=reason, amount=payment.amount, status='completed', processed_at=now)
+            for payment in payments
+        ])
+        Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+            status='refunded', updated_at=now,
+        )
+        record([refund_entry(refund, refund.payment, station_id) for refund in refunds])
+        release_ports({station_id: len(ids)})
+        reservations_changed([station_id])
+    return len(ids), len(payments), sum((payment.amount for payment in payments), Decimal('0'))
+
+
+def refund_station(station_id, reason='station_defective', batch_size=500, on_batch=None):
+    """
+    Cancel every pending or confirmed reservation at a station and refund
+    the completed payments behind them.
+
+    Each batch is its own transaction, so thousands of bookings never hold
+    locks for long and progress is reported through ``on_batch(totals)``
+    after every batch. Payments still being charged are left to the
+    payment workers, which void or refund them once they see the
+    reservation is cancelled.
+    """
+    totals = {'cancelled': 0, 'refunded': 0, 'refunded_amount': Decimal('0')}
+    while True:
+        cancelled, refunded, amount = refund_batch(station_id, reason, batch_size)
+        totals['cancelled'] += cancelled
+        totals['refunded'] += refunded
+        totals['refunded_amount'] += amount
+        if cancelled and on_batch:
+            on_batch(totals)
+        if cancelled < batch_size:
+            return totals
@@ -1,10 +1,55 @@
 # payments/serializers.py
 from rest_framework import serializers
-from .models import Payment
+from .ledger import refundable_amount
+from .models import LedgerEntry, Payment, Refund, UserBalance
 
 class PaymentSerializer(serializers.ModelSerializer):
+    reservation_details = serializers.SerializerMethodField()
+    
     class Meta:
         model = Payment
-        fields = ['id', 'reservation', 'amount', 'currency', 'payment_method', 
-                 'status', 'transaction_id', 'created_at']
-        read_only_fields = ['id', 'user', 'transaction_id', 'created_at', 'status']
\ No newline at end of file
+        fields = ['id', 'reservation', 'reservation_details', 'amount', 'currency', 
+                 'payment_method', 'status', 'transaction_id', 'created_at']
+        read_only_fields = ['id', 'user', 'transaction_id', 'created_at', 'status']
+    
+    def get_reservation_details(self, obj):
+        reservation = obj.reservation or obj.archived_reservation
+        if reservation:
+            return {
+                'station_name': reservation.station.name,
+                'start_time': reservation.start_time,
+                'end_time': reservation.end_time,
+            }
+        return None
+
+    def validate_reservation(self, reservation):
+        request = self.context.get('request')
+        if reservation and request and reservation.user_id != request.user.id:
+            raise serializers.ValidationError("Reservation not found")
+        return reservation
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LedgerEntry
+        fields = ['id', 'entry_type', 'amount', 'currency', 'payment', 'refund', 'station', 'memo', 'created_at']
+        read_only_fields = fields
+
+class BalanceSerializer(serializers.ModelSerializer):
+    net = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = UserBalance
+        fields = ['currency', 'charged', 'refunded', 'adjusted', 'net', 'entries', 'updated_at']
+        read_only_fields = fields
+
+class RefundRequestSerializer(serializers.Serializer):
+    """Refund asked for by the customer; ``payment`` comes through the context."""
+    reason = serializers.ChoiceField(choices=Refund.REFUND_REASONS, default='user_cancelled')
+    amount = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+
+    def validate_amount(self, amount):
+        if amount <= 0:
+            raise serializers.ValidationError("Refund amount must be positive")
+        if amount > refundable_amount(self.context['payment']):
+            raise serializers.ValidationError("Refund amount cannot exceed what was charged and not yet refunded")
+        return amount
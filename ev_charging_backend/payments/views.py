@@ -1,18 +1,133 @@
-from rest_framework import viewsets, permissions
-from .models import Payment
+# payments/views.py - Payment processing
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from rest_framework import viewsets, permissions, status
+from rest_framework.response import Response
+from rest_framework.decorators import action
+from ev_charging_backend.idempotency import IdempotentCreateMixin
+from ev_charging_backend.pagination import KeysetPagination
+from .ledger import payment_station_id, record, refund_entry, refundable_amount
+from .models import LedgerEntry, Payment, Refund, UserBalance
+from .processing import PAYMENT_LEASE, charge_payment
+from .revenue import GROUPS, INTERVALS, MAX_ANALYTICS_DAYS, revenue_analytics
+from .serializers import BalanceSerializer, LedgerEntrySerializer, PaymentSerializer, RefundRequestSerializer
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+class StatementPagination(KeysetPagination):
+    ordering = ('-id',)
+
+class PaymentViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
+    serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaymentPagination
+    # A payment's amount, method and reservation are fixed once created:
+    # workers charge and refunds are capped against what was submitted.
+    # Nor can it be deleted; the ledger keeps its history (see LedgerEntry)
+    http_method_names = ['get', 'post', 'head', 'options']
     
     def get_queryset(self):
-        return Payment.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Payment.objects.filter(user=self.request.user).select_related(
+            'reservation__station', 'archived_reservation__station'
+        )
+        if self.action == 'list':
+            # Only what PaymentSerializer renders, joined in the same query
+            queryset = queryset.only(
+                'id', 'amount', 'currency', 'payment_method', 'status', 'transaction_id', 'created_at',
+                'reservation__start_time', 'reservation__end_time', 'reservation__station__name',
+                'archived_reservation__start_time', 'archived_reservation__end_time',
+                'archived_reservation__station__name',
+            )
+        return queryset
+    
+    def perform_create(self, serializer):
+        eager = getattr(settings, 'PAYMENTS', {}).get('EAGER', False)
+        now = timezone.now()
+        # Queued for the payment workers; in eager mode this request takes
+        # the lease itself and charges inline
+        payment = serializer.save(
+            user=self.request.user,
+            status='processing',
+            attempts=int(eager),
+            next_attempt_at=now + PAYMENT_LEASE if eager else now,
+        )
+        if eager:
+            charge_payment(payment.pk)
+            payment.refresh_from_db()
+    
+    @action(detail=True, methods=['post'])
+    def refund(self, request, pk=None):
+        payment = self.get_object()
+        serializer = RefundRequestSerializer(data=request.data, context={'payment': payment})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        reason = serializer.validated_data['reason']
+        refund_amount = serializer.validated_data.get('amount', refundable_amount(payment))
         
-    def get_serializer_class(self):
-        from rest_framework import serializers
+        with transaction.atomic():
+            # Conditional, so concurrent requests cannot refund twice
+            if not Payment.objects.filter(pk=payment.pk, status='completed').update(
+                status='refunded', updated_at=timezone.now()
+            ):
+                return Response(
+                    {'error': 'Can only refund completed payments'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            refund = Refund.objects.create(
+                payment=payment,
+                reason=reason,
+                amount=refund_amount,
+                status='completed',  # Simulate instant refund
+                processed_at=timezone.now(),
+            )
+            record([refund_entry(refund, payment, payment_station_id(payment))])
         
-        class PaymentSerializer(serializers.ModelSerializer):
-            class Meta:
-                model = Payment
-                fields = '__all__'
-                
-        return PaymentSerializer
\ No newline at end of file
+        return Response({
+            'message': 'Refund processed successfully',
+            'refund_id': refund.id,
+            'amount': refund_amount
+        })
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        balances = UserBalance.objects.filter(user=request.user).order_by('currency')
+        return Response({'balances': BalanceSerializer(balances, many=True).data})
+
+    @action(detail=False, methods=['get'])
+    def statement(self, request):
+        entries = LedgerEntry.objects.filter(user=request.user)
+        paginator = StatementPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        return paginator.get_paginated_response(LedgerEntrySerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def analytics(self, request):
+        """Revenue time series from the daily rollups, for operators."""
+        params = request.query_params
+        try:
+            end_day = parse_date(params['to']) if params.get('to') else timezone.localdate() + timedelta(days=1)
+            start_day = parse_date(params['from']) if params.get('from') else end_day - timedelta(days=30)
+            station_ids = [int(pk) for pk in params['station'].split(',')] if params.get('station') else None
+            if start_day is None or end_day is None:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'from/to must be YYYY-MM-DD dates and station a list of ids'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        group = params.get('group') or None
+        interval = params.get('interval', 'day')
+        if group is not None and group not in GROUPS:
+            return Response({'error': f'group must be one of {", ".join(GROUPS)}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if interval not in INTERVALS:
+            return Response({'error': f'interval must be one of {", ".join(INTERVALS)}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < (end_day - start_day).days <= MAX_ANALYTICS_DAYS:
+            return Response({'error': f'to must be after from, at most {MAX_ANALYTICS_DAYS} days apart'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        series = revenue_analytics(start_day, end_day, group, interval, station_ids)
+        return Response({'from': start_day, 'to': end_day, 'group': group, 'interval': interval, 'series': series})
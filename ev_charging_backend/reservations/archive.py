@@ -0,0 +1,60 @@
+# reservations/archive.py - Move finished reservations out of the hot table
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from payments.models import Payment
+from .models import ArchivedReservation, Reservation
+
+# Reservations in these states never block a port again
+TERMINAL_STATUSES = ['completed', 'cancelled', 'expired']
+
+ARCHIVED_FIELDS = ['id', 'user_id', 'station_id', 'start_time', 'end_time', 'status', 'estimated_cost', 'created_at']
+
+
+def archivable_reservations(older_than_days, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=older_than_days)
+    return Reservation.objects.filter(status__in=TERMINAL_STATUSES, end_time__lt=cutoff)
+
+
+def archive_batch(queryset, batch_size):
+    """
+    Copy up to ``batch_size`` reservations into the archive and delete them,
+    in one transaction. Payments are re-pointed at the archived copy first so
+    the delete does not cascade to them.
+    """
+    with transaction.atomic():
+        rows = list(queryset.select_for_update(skip_locked=True).order_by('id').values(*ARCHIVED_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        ArchivedReservation.objects.bulk_create(
+            [ArchivedReservation(**row) for row in rows],
+            ignore_conflicts=True,
+        )
+        Payment.objects.filter(reservation_id__in=ids).update(
+            archived_reservation_id=F('reservation_id'),
+            reservation=None,
+        )
+        Reservation.objects.filter(pk__in=ids).delete()
+    return len(rows)
+
+
+def archive_reservations(older_than_days=90, batch_size=1000, on_batch=None):
+    """
+    Archive terminal reservations that ended more than ``older_than_days`` ago.
+
+    Works in short batches so locks are held briefly and the job can run
+    while the API is serving traffic. ``on_batch(archived)`` reports progress.
+    """
+    queryset = archivable_reservations(older_than_days)
+    archived = 0
+    while True:
+        count = archive_batch(queryset, batch_size)
+        archived += count
+        if count and on_batch:
+            on_batch(archived)
+        if count < batch_size:
+            return archived
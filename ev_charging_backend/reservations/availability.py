@@ -0,0 +1,153 @@
+# reservations/availability.py - Port occupancy sweep-line and free-slot search
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, DateTimeField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Reservation
+
+# Reservations that hold a port for their whole interval
+BLOCKING_STATUSES = ['pending', 'confirmed', 'active']
+
+INTERVALS_CACHE_TIMEOUT = 60 * 15
+
+# Longest slot the availability and suggestion searches accept
+MAX_SLOT_DURATION = timedelta(hours=24)
+
+
+def intervals_cache_key(station_id):
+    return f'reservations:intervals:{station_id}'
+
+
+def get_station_intervals(station_id):
+    """
+    Return the (start, end) pairs of a station's blocking reservations that
+    have not ended yet, sorted by start.
+
+    Loaded with one indexed range query and cached per station until a
+    reservation at that station changes (see reservations.signals).
+    """
+    key = intervals_cache_key(station_id)
+    intervals = cache.get(key)
+    if intervals is None:
+        intervals = list(
+            Reservation.objects.filter(
+                station_id=station_id,
+                status__in=BLOCKING_STATUSES,
+                end_time__gt=timezone.now(),
+            ).order_by('start_time').values_list('start_time', 'end_time')
+        )
+        cache.set(key, intervals, INTERVALS_CACHE_TIMEOUT)
+    return intervals
+
+
+def invalidate_station_intervals(station_ids):
+    cache.delete_many([intervals_cache_key(station_id) for station_id in station_ids])
+
+
+def peak_occupancy(station_id, window_start, window_end, exclude_id=None):
+    """
+    Maximum number of blocking reservations held at any instant of the window.
+
+    Occupancy only rises at a reservation start (or at the window start), so
+    the peak is the largest count of reservations covering one of those
+    points. That is computed in a single aggregate query with a correlated
+    subquery, both sides served by the (station, status, start, end) index.
+    """
+    overlapping = Reservation.objects.filter(
+        station_id=station_id,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=window_end,
+        end_time__gt=window_start,
+    )
+    if exclude_id is not None:
+        overlapping = overlapping.exclude(pk=exclude_id)
+
+    covering = overlapping.filter(
+        start_time__lte=OuterRef('point'),
+        end_time__gt=OuterRef('point'),
+    ).values('station_id').annotate(held=Count('id')).values('held')
+
+    result = overlapping.annotate(
+        point=Greatest('start_time', Value(window_start, output_field=DateTimeField())),
+    ).annotate(
+        concurrent=Subquery(covering),
+    ).aggregate(peak=Max('concurrent'))
+    return result['peak'] or 0
+
+
+def occupancy_timeline(intervals, window_start, window_end):
+    """
+    Sweep-line over half-open intervals clipped to the window.
+
+    Returns consecutive (start, end, occupied) segments covering exactly
+    [window_start, window_end), where ``occupied`` is the number of
+    overlapping intervals during that segment.
+    """
+    events = []
+    for start, end in intervals:
+        start = max(start, window_start)
+        end = min(end, window_end)
+        if start < end:
+            events.append((start, 1))
+            events.append((end, -1))
+    # Ends sort before starts at the same instant: back-to-back bookings share a port
+    events.sort()
+
+    timeline = []
+    occupied = 0
+    cursor = window_start
+    for instant, delta in events:
+        if instant > cursor:
+            if timeline and timeline[-1][2] == occupied:
+                timeline[-1] = (timeline[-1][0], instant, occupied)
+            else:
+                timeline.append((cursor, instant, occupied))
+            cursor = instant
+        occupied += delta
+    if cursor < window_end:
+        if timeline and timeline[-1][2] == occupied:
+            timeline[-1] = (timeline[-1][0], window_end, occupied)
+        else:
+            timeline.append((cursor, window_end, occupied))
+    return timeline
+
+
+def free_slots(timeline, capacity, duration):
+    """Maximal windows with at least one free port lasting at least ``duration``."""
+    slots = []
+    current = None
+    for start, end, occupied in timeline:
+        if occupied < capacity:
+            if current and current[1] == start:
+                current = (current[0], end)
+            else:
+                if current:
+                    slots.append(current)
+                current = (start, end)
+        elif current:
+            slots.append(current)
+            current = None
+    if current:
+        slots.append(current)
+    return [(start, end) for start, end in slots if end - start >= duration]
+
+
+def station_availability(station, window_start, window_end, duration):
+    """Free ports over time and bookable slots for one station."""
+    if station.status != 'active':
+        timeline = [(window_start, window_end, station.total_ports)]
+    else:
+        timeline = occupancy_timeline(get_station_intervals(station.pk), window_start, window_end)
+    return {
+        'timeline': [
+            {'start': start, 'end': end, 'available_ports': max(station.total_ports - occupied, 0)}
+            for start, end, occupied in timeline
+        ],
+        'slots': [
+            {'start': start, 'end': end}
+            for start, end in free_slots(timeline, station.total_ports, duration)
+        ],
+    }
@@ -0,0 +1,78 @@
+# reservations/bulk.py - Book many slots against one snapshot of station occupancy
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from stations.models import ChargingStation
+from stations.ports import claim_ports
+from .availability import BLOCKING_STATUSES, occupancy_timeline
+from .models import Reservation
+from .signals import reservations_changed
+
+BULK_RESERVATION_LIMIT = 100
+
+
+class BulkBookingConflict(Exception):
+    """Station counters changed under the batch; nothing was booked."""
+
+
+def _peak(intervals, start_time, end_time):
+    return max((occupied for _, _, occupied in occupancy_timeline(intervals, start_time, end_time)), default=0)
+
+
+def book_many(user, items):
+    """
+    Book validated items (dicts with station id, start/end time and cost).
+
+    Involved stations are locked and their blocking reservations loaded in
+    one query each; every item is then checked in memory against that
+    snapshot plus the items accepted before it. Accepted items are inserted
+    with one ``bulk_create`` and their ports taken with one grouped UPDATE.
+
+    Returns one ``(reservation, None)`` or ``(None, error)`` pair per item.
+    """
+    station_ids = {item['station'] for item in items}
+    with transaction.atomic():
+        stations = ChargingStation.objects.select_for_update().in_bulk(station_ids)
+        window_start = min(item['start_time'] for item in items)
+        window_end = max(item['end_time'] for item in items)
+        intervals = defaultdict(list)
+        for station_id, start_time, end_time in Reservation.objects.filter(
+            station_id__in=station_ids,
+            status__in=BLOCKING_STATUSES,
+            start_time__lt=window_end,
+            end_time__gt=window_start,
+        ).values_list('station_id', 'start_time', 'end_time'):
+            intervals[station_id].append((start_time, end_time))
+
+        claimed = Counter()
+        results = []
+        accepted = []
+        for item in items:
+            station = stations.get(item['station'])
+            start_time, end_time = item['start_time'], item['end_time']
+            if station is None:
+                results.append((None, 'Station not found'))
+            elif station.available_ports - claimed[station.pk] <= 0:
+                results.append((None, 'No available ports at this station'))
+            elif _peak(intervals[station.pk], start_time, end_time) >= station.total_ports:
+                results.append((None, 'Station is fully booked for this time period'))
+            else:
+                reservation = Reservation(
+                    user=user,
+                    station=station,
+                    start_time=start_time,
+                    end_time=end_time,
+                    estimated_cost=item['estimated_cost'],
+                )
+                intervals[station.pk].append((start_time, end_time))
+                claimed[station.pk] += 1
+                accepted.append(reservation)
+                results.append((reservation, None))
+
+        if accepted:
+            if not claim_ports(claimed):
+                raise BulkBookingConflict('Port availability changed, retry the batch')
+            Reservation.objects.bulk_create(accepted)
+            reservations_changed(claimed)
+    return results
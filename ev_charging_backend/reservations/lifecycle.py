@@ -0,0 +1,22 @@
+# reservations/lifecycle.py - Race-free reservation status transitions
+from django.utils import timezone
+
+from .models import Reservation
+from .signals import reservations_changed
+
+
+def transition(reservation, from_statuses, to_status):
+    """
+    Move a reservation to ``to_status`` only if it is still in one of
+    ``from_statuses``, as a single conditional UPDATE.
+
+    Returns False when a concurrent request got there first, so callers
+    release a port at most once per reservation.
+    """
+    updated = Reservation.objects.filter(
+        pk=reservation.pk, status__in=from_statuses
+    ).update(status=to_status, updated_at=timezone.now())
+    if updated:
+        reservation.status = to_status
+        reservations_changed([reservation.station_id])
+    return bool(updated)
@@ -0,0 +1,32 @@
+# reservations/management/commands/archive_reservations.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from reservations.archive import archive_reservations
+
+class Command(BaseCommand):
+    help = 'Move completed, cancelled and expired reservations older than N days to the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Archive reservations that ended this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations moved per transaction')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must be >= 0 and --batch-size positive')
+
+        started = time.monotonic()
+
+        def on_batch(archived):
+            self.stdout.write(f'{archived} reservations archived')
+
+        archived = archive_reservations(
+            older_than_days=options['days'],
+            batch_size=options['batch_size'],
+            on_batch=on_batch,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Archived {archived} reservations in {time.monotonic() - started:.1f}s'
+            )
+        )
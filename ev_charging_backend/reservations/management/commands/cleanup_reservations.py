@@ -0,0 +1,20 @@
+# reservations/management/commands/cleanup_reservations.py
+from django.core.management.base import BaseCommand, CommandError
+from reservations.tasks import process_due_reservations
+
+class Command(BaseCommand):
+    help = 'Expire no-show reservations, complete ended sessions and free their ports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations closed per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        expired, completed = process_due_reservations(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {expired} expired and {completed} completed reservations'
+            )
+        )
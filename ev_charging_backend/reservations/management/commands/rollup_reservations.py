@@ -0,0 +1,28 @@
+# reservations/management/commands/rollup_reservations.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from reservations.rollups import refresh_rollups
+
+class Command(BaseCommand):
+    help = 'Fold reservations changed since the last run into the hourly station rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Reservations folded per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        started = time.monotonic()
+
+        def on_batch(changed, buckets):
+            self.stdout.write(f'{changed} reservations folded into {buckets} hourly buckets')
+
+        result = refresh_rollups(batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Folded {result['changed']} changed reservations in {time.monotonic() - started:.1f}s, "
+                f"watermark now {result['watermark']:%Y-%m-%d %H:%M:%S}"
+            )
+        )
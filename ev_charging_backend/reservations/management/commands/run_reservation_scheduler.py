@@ -0,0 +1,39 @@
+# reservations/management/commands/run_reservation_scheduler.py
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from reservations.tasks import ReservationScheduler
+
+class Command(BaseCommand):
+    help = 'Run until stopped, expiring and completing reservations as their deadlines pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', type=int, default=30, help='Seconds between deadline reloads')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations closed per transaction')
+
+    def handle(self, *args, **options):
+        if options['refresh'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--refresh and --batch-size must be positive')
+
+        def on_processed(expired, completed):
+            self.stdout.write(
+                f'{timezone.now():%Y-%m-%d %H:%M:%S} processed {expired} expired '
+                f'and {completed} completed reservations'
+            )
+
+        def on_error(exc):
+            self.stderr.write(f'Database error, retrying in {options["refresh"]}s: {exc}')
+
+        scheduler = ReservationScheduler(
+            refresh=options['refresh'],
+            batch_size=options['batch_size'],
+            on_processed=on_processed,
+            on_error=on_error,
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: scheduler.stop())
+
+        self.stdout.write(f'Reservation scheduler started (refresh every {options["refresh"]}s)')
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS('Reservation scheduler stopped'))
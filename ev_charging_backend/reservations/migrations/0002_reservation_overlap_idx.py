@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0001_initial"),
+        ("stations", "0005_chargingstation_external_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["station", "status", "start_time", "end_time"],
+                name="reservation_overlap_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0002_reservation_overlap_idx"),
+        ("stations", "0005_chargingstation_external_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["status", "start_time"], name="reservation_status_start_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["status", "end_time"], name="reservation_status_end_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reservations", "0005_user_created_idx"),
+        ("stations", "0005_chargingstation_external_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReservationRollupState",
+            fields=[
+                (
+                    "reservation_id",
+                    models.BigIntegerField(primary_key=True, serialize=False),
+                ),
+                ("station_id", models.BigIntegerField()),
+                ("start_time", models.DateTimeField()),
+                ("end_time", models.DateTimeField()),
+                ("status", models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("value", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="reservation",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="StationHourlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hour", models.DateTimeField()),
+                ("occupancy_minutes", models.FloatField(default=0)),
+                ("bookings", models.IntegerField(default=0)),
+                ("cancellations", models.IntegerField(default=0)),
+                ("expiries", models.IntegerField(default=0)),
+                (
+                    "station",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="stations.chargingstation",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["hour"], name="rollup_hour_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("station", "hour"), name="rollup_station_hour_unique"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -21,6 +21,19 @@ class Reservation(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     estimated_cost = models.DecimalField(max_digits=8, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by every write, including queryset updates; drives incremental rollups
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    class Meta:
+        indexes = [
+            # Overlap and occupancy checks: one station, blocking statuses, a time range
+            models.Index(fields=['station', 'status', 'start_time', 'end_time'], name='reservation_overlap_idx'),
+            # Expiry and auto-completion sweeps across all stations
+            models.Index(fields=['status', 'start_time'], name='reservation_status_start_idx'),
+            models.Index(fields=['status', 'end_time'], name='reservation_status_end_idx'),
+            # Per-user listing in keyset order
+            models.Index(fields=['user', '-created_at', '-id'], name='reservation_user_created_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.end_time and self.start_time:
@@ -28,4 +41,64 @@ class Reservation(models.Model):
         super().save(*args, **kwargs)
     
     def is_expired(self):
-        return timezone.now() > self.end_time and self.status in ['pending', 'confirmed']
\ No newline at end of file
+        return timezone.now() > self.end_time and self.status in ['pending', 'confirmed']
+
+class ArchivedReservation(models.Model):
+    """
+    Finished reservation moved out of the hot table by reservations.archive.
+
+    Keeps the original primary key so links from payments and clients stay
+    valid; nothing here takes part in overlap checks or expiry sweeps.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    station = models.ForeignKey(ChargingStation, on_delete=models.CASCADE)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    estimated_cost = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_user_created_idx'),
+        ]
+
+
+class StationHourlyRollup(models.Model):
+    """Occupancy and demand for one station during one hour (UTC), see reservations.rollups"""
+    station = models.ForeignKey(ChargingStation, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    occupancy_minutes = models.FloatField(default=0)
+    bookings = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    expiries = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'hour'], name='rollup_station_hour_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='rollup_hour_idx'),
+        ]
+
+
+class ReservationRollupState(models.Model):
+    """
+    The reservation as it was last folded into the rollups, so a later
+    change can be applied as a delta without rescanning anything.
+    """
+    reservation_id = models.BigIntegerField(primary_key=True)
+    station_id = models.BigIntegerField()
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(max_length=20)
+
+
+class RollupWatermark(models.Model):
+    """How far an incremental rollup job has processed its source table."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DateTimeField()
+    # Last id folded in, for append-only sources read in id order
+    position = models.BigIntegerField(default=0)
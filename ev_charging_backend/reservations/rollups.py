@@ -0,0 +1,178 @@
+# reservations/rollups.py - Incremental hourly occupancy and demand per station
+import datetime
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from stations.models import ChargingStation
+from .models import Reservation, ReservationRollupState, RollupWatermark, StationHourlyRollup
+
+WATERMARK = 'station_hourly'
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# Re-read rows this far behind the watermark to catch transactions that
+# committed late; folding the same state in twice is a no-op.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Statuses whose time window counts as occupied
+OCCUPYING_STATUSES = {'pending', 'confirmed', 'active', 'completed'}
+COUNTERS = ['occupancy_minutes', 'bookings', 'cancellations', 'expiries']
+STATE_FIELDS = ['station_id', 'start_time', 'end_time', 'status']
+
+
+def hour_floor(value):
+    return value.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def contributions(state, sign=1):
+    """Yield ((station_id, hour), counter, amount) for one reservation state."""
+    station_id, start_time, end_time, status = state
+    start_hour = hour_floor(start_time)
+    yield (station_id, start_hour), 'bookings', sign
+    if status == 'cancelled':
+        yield (station_id, start_hour), 'cancellations', sign
+    elif status == 'expired':
+        yield (station_id, start_hour), 'expiries', sign
+    if status in OCCUPYING_STATUSES:
+        hour = start_hour
+        while hour < end_time:
+            following = hour + timedelta(hours=1)
+            minutes = (min(end_time, following) - max(start_time, hour)).total_seconds() / 60
+            if minutes > 0:
+                yield (station_id, hour), 'occupancy_minutes', sign * minutes
+            hour = following
+
+
+def apply_deltas(deltas):
+    """Add per-bucket deltas to the rollup rows: one read, one insert, one update."""
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return 0
+    station_ids = {station_id for station_id, _ in deltas}
+    hours = {hour for _, hour in deltas}
+    existing = {
+        (row.station_id, row.hour): row
+        for row in StationHourlyRollup.objects.filter(station_id__in=station_ids, hour__in=hours)
+    }
+    created, updated = [], []
+    for (station_id, hour), values in deltas.items():
+        row = existing.get((station_id, hour))
+        if row is None:
+            row = StationHourlyRollup(station_id=station_id, hour=hour)
+            created.append(row)
+        else:
+            updated.append(row)
+        for counter, amount in values.items():
+            setattr(row, counter, getattr(row, counter) + amount)
+    StationHourlyRollup.objects.bulk_create(created)
+    StationHourlyRollup.objects.bulk_update(updated, COUNTERS)
+    return len(deltas)
+
+
+def fold_batch(reservations):
+    """Fold ``(id, station_id, start, end, status)`` rows in as deltas against their last state."""
+    ids = [row[0] for row in reservations]
+    previous = {
+        state['reservation_id']: tuple(state[field] for field in STATE_FIELDS)
+        for state in ReservationRollupState.objects.filter(reservation_id__in=ids).values('reservation_id', *STATE_FIELDS)
+    }
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    states = []
+    for pk, *current in reservations:
+        current = tuple(current)
+        if previous.get(pk) == current:
+            continue
+        if pk in previous:
+            for key, counter, amount in contributions(previous[pk], sign=-1):
+                deltas[key][counter] += amount
+        for key, counter, amount in contributions(current):
+            deltas[key][counter] += amount
+        states.append(ReservationRollupState(reservation_id=pk, **dict(zip(STATE_FIELDS, current))))
+
+    buckets = apply_deltas(deltas)
+    ReservationRollupState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=['reservation_id'],
+        update_fields=STATE_FIELDS,
+    )
+    return len(states), buckets
+
+
+def refresh_rollups(batch_size=2000, on_batch=None):
+    """
+    Fold reservations written since the last run into StationHourlyRollup.
+
+    Only rows with ``updated_at`` past the watermark are read, through the
+    updated_at index, in keyset-ordered batches of one transaction each.
+    Every batch locks the watermark row, so concurrent runs never fold the
+    same change twice. ``on_batch(changed, buckets)`` reports progress.
+    """
+    started = timezone.now()
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK, defaults={'value': EPOCH})
+    since = watermark.value - WATERMARK_OVERLAP
+    changed = buckets = 0
+    after = Q()
+    while True:
+        with transaction.atomic():
+            RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+            batch = list(
+                Reservation.objects.filter(after, updated_at__gte=since, updated_at__lte=started)
+                .order_by('updated_at', 'id')
+                .values_list('id', 'station_id', 'start_time', 'end_time', 'status', 'updated_at')[:batch_size]
+            )
+            if not batch:
+                break
+            batch_changed, batch_buckets = fold_batch([row[:-1] for row in batch])
+        changed += batch_changed
+        buckets += batch_buckets
+        if on_batch:
+            on_batch(changed, buckets)
+        if len(batch) < batch_size:
+            break
+        last_id, last_updated = batch[-1][0], batch[-1][-1]
+        after = Q(updated_at__gt=last_updated) | Q(updated_at=last_updated, id__gt=last_id)
+
+    RollupWatermark.objects.filter(name=WATERMARK, value__lt=started).update(value=started)
+    return {'changed': changed, 'buckets': buckets, 'watermark': started}
+
+
+def station_analytics(window_start, window_end, station_ids=None, group='hour'):
+    """
+    Read rollups for [window_start, window_end) summed across the selected
+    stations, per hour or per local (ISO weekday, hour) for heatmaps. Utilization
+    is occupied port-minutes over the port-minutes available in the bucket.
+    """
+    window_start, window_end = hour_floor(window_start), hour_floor(window_end)
+    rollups = StationHourlyRollup.objects.filter(hour__gte=window_start, hour__lt=window_end)
+    stations = ChargingStation.objects.all()
+    if station_ids:
+        rollups = rollups.filter(station_id__in=station_ids)
+        stations = stations.filter(pk__in=station_ids)
+    capacity = stations.aggregate(ports=Sum('total_ports'))['ports'] or 0
+
+    if group == 'weekday_hour':
+        keys = ['weekday', 'hour_of_day']
+        rollups = rollups.annotate(weekday=ExtractIsoWeekDay('hour'), hour_of_day=ExtractHour('hour'))
+        # How many times each local (weekday, hour) occurs in the window
+        occurrences = defaultdict(int)
+        hour = window_start
+        while hour < window_end:
+            local = timezone.localtime(hour)
+            occurrences[(local.isoweekday(), local.hour)] += 1
+            hour += timedelta(hours=1)
+    else:
+        keys = ['hour']
+        occurrences = None
+
+    buckets = []
+    for row in rollups.values(*keys).annotate(**{counter: Sum(counter) for counter in COUNTERS}).order_by(*keys):
+        hours = occurrences[(row['weekday'], row['hour_of_day'])] if occurrences else 1
+        available = capacity * 60 * hours
+        row['occupancy_minutes'] = round(row['occupancy_minutes'], 1)
+        row['utilization'] = round(row['occupancy_minutes'] / available, 4) if available else None
+        buckets.append(row)
+    return {'capacity_ports': capacity, 'buckets': buckets}
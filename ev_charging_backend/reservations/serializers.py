@@ -1,34 +1,64 @@
 # reservations/serializers.py
 from rest_framework import serializers
+from django.utils import timezone
+from .availability import peak_occupancy
 from .models import Reservation
-from stations.models import ChargingStation
 
 class ReservationSerializer(serializers.ModelSerializer):
     station_name = serializers.CharField(source='station.name', read_only=True)
     station_address = serializers.CharField(source='station.address', read_only=True)
-
+    can_cancel = serializers.SerializerMethodField()
+    
     class Meta:
         model = Reservation
         fields = ['id', 'station', 'station_name', 'station_address', 
-                 'start_time', 'end_time', 'status', 'estimated_cost', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
+                 'start_time', 'end_time', 'status', 'estimated_cost', 
+                 'created_at', 'can_cancel']
+        read_only_fields = ['id', 'created_at']
+
+    def get_can_cancel(self, obj):
+        now = timezone.now()
+        time_until_start = (obj.start_time - now).total_seconds() / 3600
+        return obj.status in ['pending', 'confirmed'] and time_until_start > 1
 
     def validate(self, data):
-        station = data.get('station')
-        start_time = data.get('start_time')
-        end_time = data.get('end_time')
+        instance = self.instance
+        station = data.get('station', getattr(instance, 'station', None))
+        start_time = data.get('start_time', getattr(instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(instance, 'end_time', None))
 
-        # Check if station is available
-        if station.available_ports <= 0:
+        # Check station availability
+        if station and station.available_ports <= 0:
             raise serializers.ValidationError("No available ports at this station")
 
-        # Check if start time is in the future
-        from django.utils import timezone
-        if start_time <= timezone.now():
+        # Check timing
+        now = timezone.now()
+        if start_time <= now:
             raise serializers.ValidationError("Start time must be in the future")
 
-        # Check if end time is after start time
         if end_time <= start_time:
             raise serializers.ValidationError("End time must be after start time")
 
-        return data
\ No newline at end of file
+        # Check the most ports held at any moment of the requested window
+        peak = peak_occupancy(
+            station.pk, start_time, end_time,
+            exclude_id=getattr(instance, 'pk', None)
+        )
+        if peak >= station.total_ports:
+            raise serializers.ValidationError("Station is fully booked for this time period")
+
+        return data
+
+class BulkReservationItemSerializer(serializers.Serializer):
+    """One slot of a bulk booking; availability is checked by reservations.bulk"""
+    station = serializers.IntegerField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    estimated_cost = serializers.DecimalField(max_digits=8, decimal_places=2)
+
+    def validate(self, data):
+        if data['start_time'] <= timezone.now():
+            raise serializers.ValidationError("Start time must be in the future")
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("End time must be after start time")
+        return data
@@ -0,0 +1,23 @@
+# reservations/signals.py - Invalidate per-station caches when bookings change
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .availability import invalidate_station_intervals
+from .models import Reservation
+
+
+def reservations_changed(station_ids):
+    """
+    Drop cached occupancy for these stations once the transaction commits.
+
+    Call this from code paths that bypass ``save()``, such as bulk updates.
+    """
+    station_ids = set(station_ids)
+    transaction.on_commit(lambda: invalidate_station_intervals(station_ids))
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def reservation_changed(sender, instance, **kwargs):
+    reservations_changed([instance.station_id])
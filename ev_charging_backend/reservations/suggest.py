@@ -0,0 +1,114 @@
+# reservations/suggest.py - Earliest bookable slot across nearby stations
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from stations.geo import find_nearby
+from stations.models import ChargingStation
+from .availability import BLOCKING_STATUSES
+from .models import Reservation
+
+SEARCH_HORIZON = timedelta(days=7)
+MAX_SUGGESTIONS = 50
+# Suggestions start on a SLOT_STEP boundary at least BOOKING_LEAD_TIME ahead,
+# leaving time to book them before they are in the past
+BOOKING_LEAD_TIME = timedelta(minutes=5)
+SLOT_STEP = timedelta(minutes=5)
+
+
+def first_bookable_start(now):
+    earliest = now + BOOKING_LEAD_TIME
+    past_boundary = (earliest - earliest.replace(minute=0, second=0, microsecond=0)) % SLOT_STEP
+    return earliest + (SLOT_STEP - past_boundary if past_boundary else timedelta(0))
+
+
+def earliest_windows(capacity, station_index, starts, ends, duration, horizon):
+    """
+    Earliest start of a ``duration``-long window with a free port, per station.
+
+    Times are seconds from the search start; ``station_index``/``starts``/``ends`` describe
+    the blocking intervals (already clipped to start no earlier than 0) and
+    ``capacity`` holds each station's port count. One sort and a few array
+    passes cover every station at once. Returns an array of start offsets,
+    NaN where nothing fits before ``horizon``.
+    """
+    n = len(capacity)
+    # Every station gets a zero-delta event at 0 so it has a segment from the search start
+    station = np.concatenate([station_index, station_index, np.arange(n)])
+    time = np.concatenate([starts, ends, np.zeros(n)])
+    delta = np.concatenate([np.ones(len(starts)), -np.ones(len(ends)), np.zeros(n)])
+    # By station, then time; at equal times ends come before starts
+    order = np.lexsort((delta, time, station))
+    station, time, delta = station[order], time[order], delta[order]
+
+    # Ports held from each event until the next one, per station
+    held = np.cumsum(delta)
+    first = np.flatnonzero(np.r_[True, station[1:] != station[:-1]])
+    held -= np.repeat(held[first] - delta[first], np.diff(np.r_[first, len(station)]))
+    full = held >= capacity[station]
+
+    # When is the station next full? Offsetting each station's values by its
+    # own block of 2 * horizon keeps a reversed running minimum from leaking
+    # across stations; ``horizon`` stands for "not before the horizon".
+    offset = station * 2.0 * horizon
+    blocked_at = np.where(full, np.minimum(time, horizon), horizon) + offset
+    next_full = np.minimum.accumulate(blocked_at[::-1])[::-1] - offset
+
+    fits = ~full & (next_full - time >= duration) & (time + duration <= horizon)
+    earliest = np.full(n, np.nan)
+    np.fmin.at(earliest, station[fits], time[fits])
+    return earliest
+
+
+def suggest_slots(latitude, longitude, radius_km, duration, charger_type=None, limit=10, now=None):
+    """
+    Nearby stations ranked by how soon a ``duration`` booking can start, then
+    by distance. Costs two queries: candidate stations and their intervals.
+    No suggestion starts before ``first_bookable_start(now)``.
+    """
+    begin = first_bookable_start(now or timezone.now())
+    stations = ChargingStation.objects.filter(status='active', available_ports__gt=0).only(
+        'id', 'name', 'address', 'latitude', 'longitude', 'charger_type', 'total_ports', 'price_per_kwh',
+    )
+    if charger_type:
+        stations = stations.filter(charger_type=charger_type)
+    stations = find_nearby(stations, latitude, longitude, radius_km)
+    if not stations:
+        return []
+
+    position = {station.pk: i for i, station in enumerate(stations)}
+    rows = Reservation.objects.filter(
+        station_id__in=position,
+        status__in=BLOCKING_STATUSES,
+        end_time__gt=begin,
+        start_time__lt=begin + SEARCH_HORIZON,
+    ).values_list('station_id', 'start_time', 'end_time')
+
+    station_index, starts, ends = [], [], []
+    for station_id, start_time, end_time in rows:
+        station_index.append(position[station_id])
+        starts.append(max((start_time - begin).total_seconds(), 0.0))
+        ends.append((end_time - begin).total_seconds())
+
+    earliest = earliest_windows(
+        np.array([station.total_ports for station in stations]),
+        np.array(station_index, dtype=np.int64),
+        np.array(starts, dtype=float),
+        np.array(ends, dtype=float),
+        duration.total_seconds(),
+        SEARCH_HORIZON.total_seconds(),
+    )
+
+    ranked = sorted(
+        ((offset, station) for offset, station in zip(earliest, stations) if not np.isnan(offset)),
+        key=lambda pair: (pair[0], pair[1].distance, pair[1].pk),
+    )[:limit]
+    return [
+        {
+            'station': station,
+            'start_time': begin + timedelta(seconds=float(offset)),
+            'end_time': begin + timedelta(seconds=float(offset)) + duration,
+        }
+        for offset, station in ranked
+    ]
@@ -1,203 +1,147 @@
 # reservations/tasks.py - Automatic reservation management
-from django.core.management.base import BaseCommand
-from django.utils import timezone
+import heapq
+import threading
+from collections import Counter
 from datetime import timedelta
-from reservations.models import Reservation
-from stations.models import ChargingStation
-
-class Command(BaseCommand):
-    help = 'Manage expired reservations and update station availability'
-
-    def handle(self, *args, **options):
-        now = timezone.now()
-        
-        # Find expired reservations
-        expired_reservations = Reservation.objects.filter(
-            status__in=['pending', 'confirmed'],
-            start_time__lt=now - timedelta(minutes=15)  # 15 min grace period
-        )
-        
-        expired_count = 0
-        for reservation in expired_reservations:
-            # Mark as expired
-            reservation.status = 'expired'
-            reservation.save()
-            
-            # Free up the station port
-            station = reservation.station
-            station.available_ports = min(station.available_ports + 1, station.total_ports)
-            station.save()
-            
-            expired_count += 1
-            self.stdout.write(f'Expired reservation {reservation.id} at {station.name}')
-        
-        # Auto-complete active reservations that have ended
-        completed_reservations = Reservation.objects.filter(
-            status='active',
-            end_time__lt=now
-        )
-        
-        completed_count = 0
-        for reservation in completed_reservations:
-            reservation.status = 'completed'
-            reservation.save()
-            
-            # Free up the station port
-            station = reservation.station
-            station.available_ports = min(station.available_ports + 1, station.total_ports)
-            station.save()
-            
-            completed_count += 1
-            self.stdout.write(f'Completed reservation {reservation.id} at {station.name}')
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Processed {expired_count} expired and {completed_count} completed reservations'
-            )
-        )
 
-# reservations/views.py - Enhanced with automatic management
-from rest_framework import viewsets, permissions, serializers, status
-from rest_framework.response import Response
-from rest_framework.decorators import action
+from django.db import DatabaseError, close_old_connections, transaction
 from django.utils import timezone
-from datetime import timedelta
+
+from stations.ports import release_ports
 from .models import Reservation
-from stations.models import ChargingStation
-
-class ReservationSerializer(serializers.ModelSerializer):
-    station_name = serializers.CharField(source='station.name', read_only=True)
-    station_address = serializers.CharField(source='station.address', read_only=True)
-    can_cancel = serializers.SerializerMethodField()
-    
-    class Meta:
-        model = Reservation
-        fields = ['id', 'station', 'station_name', 'station_address', 
-                 'start_time', 'end_time', 'status', 'estimated_cost', 
-                 'created_at', 'can_cancel']
-        read_only_fields = ['id', 'created_at']
-
-    def get_can_cancel(self, obj):
-        now = timezone.now()
-        time_until_start = (obj.start_time - now).total_seconds() / 3600
-        return obj.status in ['pending', 'confirmed'] and time_until_start > 1
-
-    def validate(self, data):
-        station = data.get('station')
-        start_time = data.get('start_time')
-        end_time = data.get('end_time')
-
-        # Check station availability
-        if station and station.available_ports <= 0:
-            raise serializers.ValidationError("No available ports at this station")
-
-        # Check timing
-        now = timezone.now()
-        if start_time <= now:
-            raise serializers.ValidationError("Start time must be in the future")
-
-        if end_time <= start_time:
-            raise serializers.ValidationError("End time must be after start time")
-
-        # Check for overlapping reservations at the same station
-        overlapping = Reservation.objects.filter(
-            station=station,
-            status__in=['pending', 'confirmed', 'active'],
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        ).exclude(user=self.context['request'].user)
-
-        if overlapping.count() >= station.total_ports:
-            raise serializers.ValidationError("Station is fully booked for this time period")
-
-        return data
-
-class ReservationViewSet(viewsets.ModelViewSet):
-    serializer_class = ReservationSerializer
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user).order_by('-created_at')
-    
-    def perform_create(self, serializer):
-        reservation = serializer.save(user=self.request.user)
-        
-        # Reduce available ports when reservation is created
-        station = reservation.station
-        if station.available_ports > 0:
-            station.available_ports -= 1
-            station.save()
-            
-        self.stdout.write(f'Reservation created: {reservation.id}')
-    
-    @action(detail=True, methods=['post'])
-    def cancel(self, request, pk=None):
-        reservation = self.get_object()
-        
-        if reservation.status not in ['pending', 'confirmed']:
-            return Response(
-                {'error': 'Cannot cancel this reservation'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        now = timezone.now()
-        time_until_start = (reservation.start_time - now).total_seconds() / 3600
-        
-        if time_until_start <= 1:
-            return Response(
-                {'error': 'Cannot cancel reservations less than 1 hour before start time'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Cancel the reservation
-        reservation.status = 'cancelled'
-        reservation.save()
-        
-        # Free up the station port
-        station = reservation.station
-        station.available_ports = min(station.available_ports + 1, station.total_ports)
-        station.save()
-        
-        return Response({'message': 'Reservation cancelled successfully'})
-    
-    @action(detail=True, methods=['post'])
-    def start_charging(self, request, pk=None):
-        reservation = self.get_object()
-        
-        if reservation.status != 'confirmed':
-            return Response(
-                {'error': 'Only confirmed reservations can be started'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        now = timezone.now()
-        if now < reservation.start_time - timedelta(minutes=15):
-            return Response(
-                {'error': 'Cannot start charging more than 15 minutes early'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        reservation.status = 'active'
-        reservation.save()
-        
-        return Response({'message': 'Charging session started'})
-    
-    @action(detail=True, methods=['post'])
-    def complete_charging(self, request, pk=None):
-        reservation = self.get_object()
-        
-        if reservation.status != 'active':
-            return Response(
-                {'error': 'Only active reservations can be completed'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        reservation.status = 'completed'
-        reservation.save()
-        
-        # Free up the station port
-        station = reservation.station
-        station.available_ports = min(station.available_ports + 1, station.total_ports)
-        station.save()
-        
-        return Response({'message': 'Charging session completed'})
\ No newline at end of file
+from .signals import reservations_changed
+
+# Bookings not started this long after their start time are expired
+EXPIRY_GRACE = timedelta(minutes=15)
+EXPIRABLE_STATUSES = ['pending', 'confirmed']
+
+
+def overdue_reservations(now):
+    return Reservation.objects.filter(status__in=EXPIRABLE_STATUSES, start_time__lt=now - EXPIRY_GRACE)
+
+
+def ended_sessions(now):
+    return Reservation.objects.filter(status='active', end_time__lt=now)
+
+
+def close_batch(queryset, to_status, batch_size):
+    """
+    Move up to ``batch_size`` reservations to ``to_status`` and free their ports.
+
+    One locking SELECT, one UPDATE for the reservations and one grouped UPDATE
+    for the stations, whatever the batch holds. Rows locked by a concurrent
+    cancel are skipped and left to the next batch. The UPDATE is limited to
+    the locked ids and repeats the queryset's filters, so on databases
+    without row locks a reservation cancelled in between keeps its status
+    and only the rows that really moved give their port back.
+    """
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(skip_locked=True).order_by().values_list('id', 'station_id')[:batch_size]
+        )
+        if not rows:
+            return 0
+        ids = [pk for pk, _ in rows]
+        closed = queryset.filter(pk__in=ids).update(status=to_status, updated_at=timezone.now())
+        if closed < len(rows):
+            # Some rows left the source status after the SELECT: keep those
+            # this transaction moved, which it now holds until commit
+            rows = Reservation.objects.filter(pk__in=ids, status=to_status).values_list('id', 'station_id')
+        released = Counter(station_id for _, station_id in rows)
+        release_ports(released)
+        reservations_changed(released)
+    return closed
+
+
+def close_all(queryset, to_status, batch_size=1000):
+    closed = 0
+    while True:
+        count = close_batch(queryset, to_status, batch_size)
+        closed += count
+        if count < batch_size:
+            return closed
+
+
+def process_due_reservations(now=None, batch_size=1000):
+    """Expire no-shows and complete ended sessions. Returns (expired, completed)."""
+    now = now or timezone.now()
+    expired = close_all(overdue_reservations(now), 'expired', batch_size)
+    completed = close_all(ended_sessions(now), 'completed', batch_size)
+    return expired, completed
+
+
+class ReservationScheduler:
+    """
+    Long-running loop that processes reservations as their deadlines pass.
+
+    Every ``refresh`` seconds it loads the deadlines falling before the next
+    refresh into a min-heap, then sleeps until the earliest one. Waking up
+    runs the set-based ``process_due_reservations``, so ports are freed
+    within moments of a deadline at a constant number of queries per batch.
+    Bookings made between refreshes cannot fall due before the next one:
+    their start time is in the future and expiry adds ``EXPIRY_GRACE``.
+    """
+
+    def __init__(self, refresh=30, batch_size=1000, on_processed=None, on_error=None):
+        self.refresh = timedelta(seconds=refresh)
+        self.batch_size = batch_size
+        self.on_processed = on_processed
+        self.on_error = on_error
+        self.deadlines = []
+        self.next_refresh = None
+        self._stop = threading.Event()
+
+    def load_deadlines(self, now):
+        horizon = now + self.refresh
+        deadlines = [
+            (start_time + EXPIRY_GRACE, pk)
+            for pk, start_time in Reservation.objects.filter(
+                status__in=EXPIRABLE_STATUSES, start_time__lt=horizon - EXPIRY_GRACE
+            ).values_list('id', 'start_time')
+        ]
+        deadlines += [
+            (end_time, pk)
+            for pk, end_time in Reservation.objects.filter(
+                status='active', end_time__lt=horizon
+            ).values_list('id', 'end_time')
+        ]
+        heapq.heapify(deadlines)
+        self.deadlines = deadlines
+        self.next_refresh = horizon
+
+    def process(self, now):
+        expired, completed = process_due_reservations(now, self.batch_size)
+        if self.on_processed and (expired or completed):
+            self.on_processed(expired, completed)
+
+    def tick(self, now=None):
+        """Handle whatever is due at ``now`` and return when to wake up next."""
+        now = now or timezone.now()
+        if self.next_refresh is None or now >= self.next_refresh:
+            # Also catches anything that fell due while we were not running
+            self.process(now)
+            self.load_deadlines(now)
+        elif self.deadlines and self.deadlines[0][0] < now:
+            while self.deadlines and self.deadlines[0][0] < now:
+                heapq.heappop(self.deadlines)
+            self.process(now)
+        if self.deadlines:
+            return min(self.deadlines[0][0], self.next_refresh)
+        return self.next_refresh
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                wake_at = self.tick()
+            except DatabaseError as exc:
+                # Ride out database restarts: drop the connection and start
+                # over with a full reload after one refresh period
+                if self.on_error:
+                    self.on_error(exc)
+                close_old_connections()
+                self.next_refresh = None
+                wake_at = timezone.now() + self.refresh
+            self._stop.wait(max((wake_at - timezone.now()).total_seconds(), 0))
+
+    def stop(self):
+        self._stop.set()
@@ -1,35 +1,290 @@
-from rest_framework import viewsets, permissions, serializers, status
+from rest_framework import serializers, viewsets, permissions, status
 from rest_framework.response import Response
-from .models import Reservation
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from datetime import timedelta
+from ev_charging_backend.idempotency import IdempotentCreateMixin
+from ev_charging_backend.pagination import KeysetPagination
+from ev_charging_backend.params import parse_time
 from stations.models import ChargingStation
+from stations.ports import claim_port, release_port
+from .availability import MAX_SLOT_DURATION, peak_occupancy
+from .bulk import BULK_RESERVATION_LIMIT, BulkBookingConflict, book_many
+from .lifecycle import transition
+from .rollups import station_analytics
+from .models import ArchivedReservation, Reservation
+from .serializers import BulkReservationItemSerializer, ReservationSerializer
+from .suggest import MAX_SUGGESTIONS, suggest_slots
 
-class ReservationSerializer(serializers.ModelSerializer):
-    station_name = serializers.CharField(source='station.name', read_only=True)
-    station_address = serializers.CharField(source='station.address', read_only=True)
-    
-    class Meta:
-        model = Reservation
-        fields = ['id', 'station', 'station_name', 'station_address', 
-                 'start_time', 'end_time', 'status', 'estimated_cost', 'created_at']
-        read_only_fields = ['id', 'created_at']
-
-    def validate(self, data):
-        station = data.get('station')
-        if station and station.available_ports <= 0:
-            raise serializers.ValidationError("No available ports at this station")
-        return data
-
-class ReservationViewSet(viewsets.ModelViewSet):
+MAX_SUGGEST_RADIUS_KM = 50
+CHARGER_TYPES = {code for code, _ in ChargingStation.CHARGER_TYPES}
+
+MAX_ANALYTICS_WINDOW = timedelta(days=366)
+ANALYTICS_GROUPS = ['hour', 'weekday_hour']
+
+# Columns ReservationSerializer renders, loaded with the station in one join
+LIST_COLUMNS = [
+    'id', 'station_id', 'start_time', 'end_time', 'status', 'estimated_cost', 'created_at',
+    'station__name', 'station__address',
+]
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class ReservationViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    pagination_class = ReservationPagination
+    
     def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Reservation.objects.filter(user=self.request.user).select_related('station')
+        if self.action == 'list':
+            queryset = queryset.only(*LIST_COLUMNS)
+        return queryset.order_by('-created_at')
+
+    def get_archived_queryset(self):
+        queryset = ArchivedReservation.objects.filter(user=self.request.user).select_related('station')
+        if self.action == 'list':
+            queryset = queryset.only(*LIST_COLUMNS)
+        return queryset.order_by('-created_at')
+
+    def wants_history(self):
+        # Archived reservations are only read when the client asks for them
+        return self.request.query_params.get('history', '').lower() in ('1', 'true')
+
+    def list(self, request, *args, **kwargs):
+        if not self.wants_history():
+            return super().list(request, *args, **kwargs)
+        page = self.paginator.paginate_querysets(
+            [self.get_queryset(), self.get_archived_queryset()], request, view=self
+        )
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.wants_history():
+                raise
+        reservation = get_object_or_404(self.get_archived_queryset(), pk=kwargs['pk'])
+        return Response(self.get_serializer(reservation).data)
     
     def perform_create(self, serializer):
-        reservation = serializer.save(user=self.request.user)
-        # Reduce available ports when reservation is created
-        station = reservation.station
-        if station.available_ports > 0:
-            station.available_ports -= 1
-            station.save()
\ No newline at end of file
+        station = serializer.validated_data['station']
+        with transaction.atomic():
+            # Take the port with a conditional UPDATE; concurrent bookings for
+            # the same station queue on its row lock until we commit.
+            if not claim_port(station.pk):
+                raise ValidationError({'non_field_errors': ['No available ports at this station']})
+
+            # Re-check the window now that earlier bookings are visible
+            peak = peak_occupancy(
+                station.pk,
+                serializer.validated_data['start_time'],
+                serializer.validated_data['end_time'],
+            )
+            if peak >= station.total_ports:
+                raise ValidationError({'non_field_errors': ['Station is fully booked for this time period']})
+
+            serializer.save(user=self.request.user)
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Soonest slots of ?duration= minutes at active stations within ?radius= km."""
+        params = request.query_params
+        if not params.get('lat') or not params.get('lng'):
+            return Response({'error': 'lat and lng parameters required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            lat = float(params['lat'])
+            lng = float(params['lng'])
+            radius = float(params.get('radius', 5))
+            duration = timedelta(minutes=int(params.get('duration', 60)))
+            limit = int(params.get('limit', 10))
+        except (OverflowError, ValueError):
+            return Response({'error': 'lat, lng, radius, duration and limit must be numbers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        charger_type = params.get('charger_type')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({'error': 'lat/lng out of range'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius <= MAX_SUGGEST_RADIUS_KM:
+            return Response({'error': f'radius must be between 0 and {MAX_SUGGEST_RADIUS_KM} km'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not timedelta(0) < duration <= MAX_SLOT_DURATION:
+            return Response({'error': f'duration must be between 1 and {MAX_SLOT_DURATION // timedelta(minutes=1)} minutes'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < limit <= MAX_SUGGESTIONS:
+            return Response({'error': f'limit must be between 1 and {MAX_SUGGESTIONS}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if charger_type and charger_type not in CHARGER_TYPES:
+            return Response({'error': f'unknown charger_type {charger_type!r}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        suggestions = suggest_slots(lat, lng, radius, duration, charger_type=charger_type, limit=limit)
+        as_text = serializers.DateTimeField().to_representation
+        return Response([
+            {
+                'station': suggestion['station'].id,
+                'station_name': suggestion['station'].name,
+                'station_address': suggestion['station'].address,
+                'charger_type': suggestion['station'].charger_type,
+                'price_per_kwh': str(suggestion['station'].price_per_kwh),
+                'distance': round(suggestion['station'].distance, 3),
+                'start_time': as_text(suggestion['start_time']),
+                'end_time': as_text(suggestion['end_time']),
+            }
+            for suggestion in suggestions
+        ])
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def analytics(self, request):
+        """Hourly occupancy and demand from the rollups, for operators."""
+        params = request.query_params
+        now = timezone.now()
+        try:
+            window_end = parse_time(params.get('to')) or now
+            window_start = parse_time(params.get('from')) or window_end - timedelta(days=7)
+            station_ids = [int(pk) for pk in params['station'].split(',')] if params.get('station') else None
+        except ValueError:
+            return Response({'error': 'from/to must be ISO 8601 datetimes and station a list of ids'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        group = params.get('group', 'hour')
+        if group not in ANALYTICS_GROUPS:
+            return Response({'error': f'group must be one of {", ".join(ANALYTICS_GROUPS)}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not timedelta(0) < window_end - window_start <= MAX_ANALYTICS_WINDOW:
+            return Response({'error': f'to must be after from, at most {MAX_ANALYTICS_WINDOW.days} days apart'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        result = station_analytics(window_start, window_end, station_ids, group)
+        return Response({'from': window_start, 'to': window_end, 'group': group, **result})
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        items = request.data.get('reservations') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Send a non-empty list of reservations'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > BULK_RESERVATION_LIMIT:
+            return Response(
+                {'error': f'At most {BULK_RESERVATION_LIMIT} reservations per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = BulkReservationItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'rejected', 'errors': serializer.errors}
+
+        if valid:
+            try:
+                booked = book_many(request.user, [data for _, data in valid])
+            except BulkBookingConflict as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+            for (index, _), (reservation, error) in zip(valid, booked):
+                if reservation is None:
+                    results[index] = {'index': index, 'status': 'rejected', 'errors': {'non_field_errors': [error]}}
+                else:
+                    results[index] = {
+                        'index': index,
+                        'status': 'created',
+                        'reservation': ReservationSerializer(reservation, context=self.get_serializer_context()).data,
+                    }
+
+        created = sum(result['status'] == 'created' for result in results)
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': created, 'rejected': len(results) - created, 'results': results},
+                        status=response_status)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        reservation = self.get_object()
+        
+        if reservation.status not in ['pending', 'confirmed']:
+            return Response(
+                {'error': 'Cannot cancel this reservation'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        time_until_start = (reservation.start_time - now).total_seconds() / 3600
+        
+        if time_until_start <= 1:
+            return Response(
+                {'error': 'Cannot cancel reservations less than 1 hour before start time'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            if not transition(reservation, ['pending', 'confirmed'], 'cancelled'):
+                return Response(
+                    {'error': 'Cannot cancel this reservation'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Free up the station port
+            release_port(reservation.station_id)
+        
+        return Response({'message': 'Reservation cancelled successfully'})
+    
+    @action(detail=True, methods=['post'])
+    def start_charging(self, request, pk=None):
+        reservation = self.get_object()
+        
+        if reservation.status != 'confirmed':
+            return Response(
+                {'error': 'Only confirmed reservations can be started'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        if now < reservation.start_time - timedelta(minutes=15):
+            return Response(
+                {'error': 'Cannot start charging more than 15 minutes early'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        reservation.status = 'active'
+        reservation.save()
+        
+        return Response({'message': 'Charging session started'})
+    
+    @action(detail=True, methods=['post'])
+    def complete_charging(self, request, pk=None):
+        reservation = self.get_object()
+        
+        if reservation.status != 'active':
+            return Response(
+                {'error': 'Only active reservations can be completed'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            if not transition(reservation, ['active'], 'completed'):
+                return Response(
+                    {'error': 'Only active reservations can be completed'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Free up the station port
+            release_port(reservation.station_id)
+        
+        return Response({'message': 'Charging session completed'})
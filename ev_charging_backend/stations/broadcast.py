@@ -0,0 +1,157 @@
+# stations/broadcast.py - Fan-out of live station availability changes
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    One connected client, owned by the event loop serving its request.
+
+    Pending deltas are coalesced per station, so a slow or idle client costs
+    at most one entry per station no matter how often availability changes.
+    """
+
+    def __init__(self, loop, bbox=None):
+        self.loop = loop
+        self.bbox = bbox
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def matches(self, message):
+        if self.bbox is None:
+            return True
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return (min_lat <= message['latitude'] <= max_lat
+                and min_lng <= message['longitude'] <= max_lng)
+
+    def push(self, message):
+        # Always runs on self.loop
+        self.pending[message['station_id']] = {
+            'station_id': message['station_id'],
+            'available_ports': message['available_ports'],
+            'status': message['status'],
+        }
+        self.ready.set()
+
+    async def next_batch(self, timeout=None):
+        """Wait for deltas; returns [] when ``timeout`` elapses first."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        batch = list(self.pending.values())
+        self.pending = {}
+        return batch
+
+
+class Broadcaster:
+    """In-process registry of subscriptions; safe to publish from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def subscribe(self, bbox=None):
+        subscription = Subscription(asyncio.get_running_loop(), bbox)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        get_backend().subscribed()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def deliver(self, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if not subscription.matches(message):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, message)
+            except RuntimeError:
+                # The serving loop is gone; the client disconnected
+                self.unsubscribe(subscription)
+
+
+broadcaster = Broadcaster()
+
+
+class LocalBackend:
+    """Deliver only to clients connected to this worker process."""
+
+    def __init__(self, **options):
+        pass
+
+    def publish(self, message):
+        broadcaster.deliver(message)
+
+    def subscribed(self):
+        pass
+
+
+class RedisBackend:
+    """
+    Relay messages through Redis pub/sub so every worker sees every change.
+
+    Requires the ``redis`` package. A daemon thread per worker is started on
+    the first subscription and feeds the local broadcaster.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', channel='stations:availability', **options):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message))
+
+    def subscribed(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for item in pubsub.listen():
+            broadcaster.deliver(json.loads(item['data']))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            config = getattr(settings, 'STATION_STREAM', {})
+            backend_class = import_string(config.get('BACKEND', 'stations.broadcast.LocalBackend'))
+            _backend = backend_class(**config.get('OPTIONS', {}))
+        return _backend
+
+
+def availability_message(station, deleted=False):
+    """Build the delta published for a station; coordinates drive bbox filters."""
+    return {
+        'station_id': station.pk,
+        'available_ports': 0 if deleted else station.available_ports,
+        'status': 'deleted' if deleted else station.status,
+        'latitude': float(station.latitude),
+        'longitude': float(station.longitude),
+    }
+
+
+def publish_availability(message):
+    get_backend().publish(message)
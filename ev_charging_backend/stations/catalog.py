@@ -0,0 +1,51 @@
+# stations/catalog.py - Station catalog version shared across workers
+#
+# The version lives in the default cache, which must be shared by every
+# worker process (see CACHES in settings and the stations.E001 check);
+# with a per-process cache each worker would bump its own copy.
+import hashlib
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'stations:catalog_version'
+
+
+def _seed_version():
+    # Seed from the clock so a version evicted from the cache never comes
+    # back with a value some worker or client has already seen.
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    """Return the current catalog version, initialising it if needed."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _seed_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Increment the catalog version after a station change and return it."""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, _seed_version(), timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    ETag for catalog reads, usable with ``django.views.decorators.http.etag``.
+
+    Any station change bumps the version, so the tag only needs the version
+    plus what selects the representation: the URL with its query string and
+    the negotiated media type.
+    """
+    key = '|'.join([
+        str(get_catalog_version()),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
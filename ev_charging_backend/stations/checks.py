@@ -0,0 +1,23 @@
+# stations/checks.py - Deployment checks for state shared between workers
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose contents no other process can see
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The catalog version must live in a cache every worker shares."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'The default cache ({backend}) is private to each process.',
+        hint='Set REDIS_URL, or point CACHES["default"] at a cache all workers share, so '
+             'catalog versions, ETags and idempotency keys agree between workers.',
+        id='stations.E001',
+    )]
@@ -0,0 +1,123 @@
+# stations/clusters.py - Server-side map clustering on a per-tile grid
+import math
+
+import numpy as np
+from django.core.cache import cache
+
+from .catalog import get_catalog_version
+from .locator import CHARGER_CODES, STATUS_CODES, station_locator
+
+MAX_ZOOM = 20
+CLUSTER_GRID = 8  # Cells per tile side: ~32px clusters on 256px tiles
+MAX_TILES = 64
+CLUSTER_CACHE_TIMEOUT = 60 * 10
+MAX_MERCATOR_LAT = 85.0511287798
+
+_ACTIVE = STATUS_CODES.index('active')
+
+
+def tile_coordinates(longitude, latitude, zoom):
+    """Fractional Web Mercator tile coordinates (slippy map convention)."""
+    scale = 2 ** zoom
+    latitude = np.radians(np.clip(latitude, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (np.asarray(longitude) + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(latitude) + 1.0 / np.cos(latitude)) / math.pi) / 2.0 * scale
+    limit = scale - 1e-9
+    return np.clip(x, 0, limit), np.clip(y, 0, limit)
+
+
+def tiles_for_bbox(bbox, zoom, max_tiles=MAX_TILES):
+    """
+    Return the (x, y) tiles covering ``(min_lng, min_lat, max_lng, max_lat)``.
+
+    Raises ValueError when more than ``max_tiles`` would be needed, checked
+    from the tile bounds before any tile is built.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    x0, y0 = tile_coordinates(min_lng, max_lat, zoom)  # North-west corner
+    x1, y1 = tile_coordinates(max_lng, min_lat, zoom)  # South-east corner
+    x0, y0, x1, y1 = int(x0), int(y0), int(x1), int(y1)
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > max_tiles:
+        raise ValueError(f'bbox covers more than {max_tiles} tiles at this zoom')
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _cache_key(version, zoom, x, y):
+    return f'stations:clusters:{version}:{zoom}:{x}:{y}'
+
+
+def _build_tile_clusters(columns, cell_x, cell_y, tile):
+    tile_x, tile_y = tile
+    in_tile = (cell_x // CLUSTER_GRID == tile_x) & (cell_y // CLUSTER_GRID == tile_y)
+    if not in_tile.any():
+        return []
+
+    cells = (cell_x[in_tile] % CLUSTER_GRID) * CLUSTER_GRID + cell_y[in_tile] % CLUSTER_GRID
+    cell_ids, inverse = np.unique(cells, return_inverse=True)
+    size = len(cell_ids)
+
+    ids = columns['id'][in_tile]
+    latitude = columns['latitude'][in_tile]
+    longitude = columns['longitude'][in_tile]
+    charger = columns['charger_type'][in_tile]
+    # Stations that are not active have nothing bookable right now
+    available = np.where(columns['status'][in_tile] == _ACTIVE, columns['available_ports'][in_tile], 0)
+
+    counts = np.bincount(inverse, minlength=size)
+    lat_sums = np.bincount(inverse, weights=latitude, minlength=size)
+    lng_sums = np.bincount(inverse, weights=longitude, minlength=size)
+    by_type = {}
+    for code, name in enumerate(CHARGER_CODES):
+        of_type = charger == code
+        if of_type.any():
+            by_type[name] = (
+                np.bincount(inverse[of_type], minlength=size),
+                np.bincount(inverse[of_type], weights=available[of_type], minlength=size),
+            )
+
+    clusters = []
+    for i in range(size):
+        count = int(counts[i])
+        breakdown = {
+            name: {'count': int(type_counts[i]), 'available_ports': int(type_ports[i])}
+            for name, (type_counts, type_ports) in by_type.items()
+            if type_counts[i]
+        }
+        cluster = {
+            'latitude': round(lat_sums[i] / count, 6),
+            'longitude': round(lng_sums[i] / count, 6),
+            'count': count,
+            'available_ports': sum(entry['available_ports'] for entry in breakdown.values()),
+            'by_charger_type': breakdown,
+        }
+        if count == 1:
+            cluster['station_id'] = int(ids[inverse == i][0])
+        clusters.append(cluster)
+    return clusters
+
+
+def get_clusters(bbox, zoom):
+    """
+    Return clusters for every tile covering ``bbox`` at ``zoom``.
+
+    Each tile's clusters are cached under the catalog version, so any
+    station change invalidates them and a hit costs one cache round trip.
+    Misses are computed together from the in-process locator snapshot.
+    """
+    tiles = tiles_for_bbox(bbox, zoom)
+
+    version = get_catalog_version()
+    keys = {tile: _cache_key(version, zoom, *tile) for tile in tiles}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [tile for tile in tiles if keys[tile] not in cached]
+    if missing:
+        columns = station_locator.snapshot()
+        x, y = tile_coordinates(columns['longitude'], columns['latitude'], zoom)
+        cell_x = (x * CLUSTER_GRID).astype(np.int64)
+        cell_y = (y * CLUSTER_GRID).astype(np.int64)
+        computed = {keys[tile]: _build_tile_clusters(columns, cell_x, cell_y, tile) for tile in missing}
+        cache.set_many(computed, CLUSTER_CACHE_TIMEOUT)
+        cached.update(computed)
+
+    return [cluster for tile in tiles for cluster in cached[keys[tile]]]
@@ -0,0 +1,134 @@
+# stations/geo.py - Geohash indexing and great-circle distance helpers
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells, more than enough for a parking bay
+
+# First character after 'z' in ASCII, used as an exclusive upper bound so a
+# prefix lookup becomes an index range scan on every database backend.
+_PREFIX_UPPER_BOUND = '{'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode a coordinate into a geohash string of the given precision."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    latitude = float(latitude)
+    longitude = float(longitude)
+
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (height, width) in degrees of a geohash cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Return the geohash prefixes whose union covers the search circle.
+
+    We pick the finest precision whose cells are at least as large as the
+    radius, so the circle always fits inside the 3x3 block of cells around
+    the centre. That keeps the lookup to at most nine index range scans.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+
+    precision = None
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(candidate)
+        if height >= dlat and width >= dlng:
+            precision = candidate
+            break
+
+    if precision is None:
+        return ['']  # Radius larger than a top-level cell: no useful prefix
+
+    height, width = cell_size(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = min(max(latitude + dy * height, -90.0), 90.0)
+        for dx in (-1, 0, 1):
+            lng = (longitude + dx * width + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lng, precision))
+    return sorted(cells)
+
+
+def geohash_prefix_q(prefixes, field='geohash'):
+    """Build a Q object matching rows whose geohash starts with any prefix."""
+    query = Q()
+    for prefix in prefixes:
+        if not prefix:
+            return Q()
+        query |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + _PREFIX_UPPER_BOUND})
+    return query
+
+
+def find_nearby(queryset, latitude, longitude, radius_km, limit=None):
+    """
+    Return stations within ``radius_km`` sorted by true distance.
+
+    Candidates come from the geohash index, then get an exact haversine
+    post-filter. Each returned station carries a ``distance`` attribute.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    candidates = queryset.filter(geohash_prefix_q(covering_cells(latitude, longitude, radius_km)))
+
+    results = []
+    for station in candidates:
+        distance = haversine_km(latitude, longitude, station.latitude, station.longitude)
+        if distance <= radius_km:
+            station.distance = distance
+            results.append(station)
+
+    results.sort(key=lambda s: (s.distance, s.pk))
+    if limit is not None:
+        results = results[:limit]
+    return results
@@ -0,0 +1,233 @@
+# stations/importer.py - Streaming readers and bulk upsert for station imports
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .broadcast import availability_message
+from .geo import encode_geohash
+from .models import ChargingStation
+from .signals import availability_changed, catalog_bulk_changed
+
+FORMATS = ['csv', 'json', 'ndjson']
+
+CHARGER_TYPES = {code for code, _ in ChargingStation.CHARGER_TYPES}
+STATION_STATUSES = {code for code, _ in ChargingStation.STATION_STATUS}
+
+# Columns refreshed when an imported station already exists. available_ports
+# is live state owned by reservations, so it is only set on first insert and
+# clamped when total_ports shrinks below it.
+UPSERT_FIELDS = [
+    'name', 'address', 'latitude', 'longitude', 'geohash', 'status', 'charger_type',
+    'power_rating', 'price_per_kwh', 'total_ports', 'amenities', 'updated_at',
+]
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path):
+    for fmt in FORMATS:
+        if path.lower().endswith(f'.{fmt}'):
+            return fmt
+    if path.lower().endswith('.jsonl'):
+        return 'ndjson'
+    raise ValueError(f'Cannot guess the format of {path}; pass --format')
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        if row.get('amenities'):
+            row['amenities'] = [a.strip() for a in row['amenities'].split(';') if a.strip()]
+        yield row
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_json_array(stream, buffer_size=1 << 16):
+    """Yield the objects of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if buffer:
+                if buffer[0] != '[':
+                    raise ValueError('Expected a JSON array of stations')
+                buffer = buffer[1:]
+                started = True
+                continue
+        elif buffer.startswith(']'):
+            return
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        elif buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                buffer = buffer[end:]
+                continue
+
+        if eof:
+            raise ValueError('Unexpected end of JSON input')
+        chunk = stream.read(buffer_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json_array,
+    'ndjson': read_ndjson,
+}
+
+
+def _decimal(row, field):
+    model_field = ChargingStation._meta.get_field(field)
+    try:
+        value = Decimal(str(row[field]).strip())
+        if not value.is_finite():
+            raise InvalidOperation
+        value = value.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+        model_field.run_validators(value)
+    except (KeyError, InvalidOperation, ValidationError):
+        raise RowError(f'{field} must be a number with at most '
+                       f'{model_field.max_digits - model_field.decimal_places} integer digits')
+    return value
+
+
+def _integer(row, field, default=None):
+    value = row.get(field)
+    if value in (None, ''):
+        if default is None:
+            raise RowError(f'{field} is required')
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be an integer')
+
+
+def build_station(row, now):
+    """Validate one input row and return an unsaved ChargingStation."""
+    if not isinstance(row, dict):
+        raise RowError('expected an object')
+    external_id = str(row.get('external_id') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not external_id:
+        raise RowError('external_id is required')
+    if not name:
+        raise RowError('name is required')
+
+    latitude = _decimal(row, 'latitude')
+    longitude = _decimal(row, 'longitude')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise RowError('coordinates out of range')
+
+    charger_type = str(row.get('charger_type') or '').strip().lower()
+    if charger_type not in CHARGER_TYPES:
+        raise RowError(f'unknown charger_type {charger_type!r}')
+    station_status = str(row.get('status') or 'active').strip().lower()
+    if station_status not in STATION_STATUSES:
+        raise RowError(f'unknown status {station_status!r}')
+
+    total_ports = _integer(row, 'total_ports', default=1)
+    available_ports = _integer(row, 'available_ports', default=total_ports)
+    if total_ports < 1 or not 0 <= available_ports <= total_ports:
+        raise RowError('ports must satisfy 0 <= available_ports <= total_ports')
+
+    amenities = row.get('amenities') or []
+    if not isinstance(amenities, list):
+        raise RowError('amenities must be a list')
+
+    return ChargingStation(
+        external_id=external_id,
+        name=name,
+        address=str(row.get('address') or '').strip(),
+        latitude=latitude,
+        longitude=longitude,
+        geohash=encode_geohash(latitude, longitude),
+        status=station_status,
+        charger_type=charger_type,
+        power_rating=_integer(row, 'power_rating'),
+        price_per_kwh=_decimal(row, 'price_per_kwh'),
+        total_ports=total_ports,
+        available_ports=available_ports,
+        amenities=amenities,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def upsert_chunk(stations):
+    """Insert or update a chunk of stations keyed on external_id."""
+    # ON CONFLICT cannot touch the same row twice in one statement
+    unique = list({station.external_id: station for station in stations}.values())
+    with transaction.atomic():
+        ChargingStation.objects.bulk_create(
+            unique,
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=UPSERT_FIELDS,
+        )
+        shrunk = list(ChargingStation.objects.filter(
+            external_id__in=[station.external_id for station in unique],
+            available_ports__gt=F('total_ports'),
+        ))
+        if shrunk:
+            ChargingStation.objects.filter(pk__in=[station.pk for station in shrunk]).update(
+                available_ports=F('total_ports'),
+            )
+            for station in shrunk:
+                station.available_ports = station.total_ports
+                availability_changed(availability_message(station))
+        catalog_bulk_changed()
+    return len(unique)
+
+
+def import_stations(rows, chunk_size=1000, on_error=None, on_chunk=None):
+    """
+    Validate and upsert an iterable of row dicts in fixed-size chunks.
+
+    Memory stays bounded by ``chunk_size`` whatever the input length.
+    ``on_error(row_number, message)`` is called for each rejected row and
+    ``on_chunk(processed, upserted, rejected)`` after every chunk.
+    """
+    processed = upserted = rejected = 0
+    chunk = []
+    for row_number, row in enumerate(rows, start=1):
+        processed += 1
+        try:
+            chunk.append(build_station(row, timezone.now()))
+        except RowError as exc:
+            rejected += 1
+            if on_error:
+                on_error(row_number, str(exc))
+        if len(chunk) >= chunk_size:
+            upserted += upsert_chunk(chunk)
+            chunk = []
+            if on_chunk:
+                on_chunk(processed, upserted, rejected)
+    if chunk:
+        upserted += upsert_chunk(chunk)
+    if on_chunk:
+        on_chunk(processed, upserted, rejected)
+    return processed, upserted, rejected
@@ -0,0 +1,227 @@
+# stations/locator.py - In-process station locator backed by NumPy arrays
+import threading
+
+import numpy as np
+
+from .catalog import get_catalog_version
+from .geo import EARTH_RADIUS_KM
+from .models import ChargingStation
+
+STATUS_CODES = [code for code, _ in ChargingStation.STATION_STATUS]
+CHARGER_CODES = [code for code, _ in ChargingStation.CHARGER_TYPES]
+
+LOCATOR_FIELDS = [
+    'id', 'name', 'latitude', 'longitude', 'status', 'charger_type',
+    'power_rating', 'price_per_kwh', 'total_ports', 'available_ports',
+]
+
+_INITIAL_CAPACITY = 256
+
+
+class StationLocator:
+    """
+    Per-worker snapshot of the station catalog for map and proximity queries.
+
+    Coordinates and the attributes the map filters on live in parallel NumPy
+    arrays, so radius and k-nearest queries are a single vectorised haversine
+    pass with no SQL. The snapshot is patched in place from model signals and
+    fully reloaded whenever the shared catalog version shows that another
+    worker changed something we did not see.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._allocate(_INITIAL_CAPACITY)
+
+    def _allocate(self, capacity):
+        self._size = 0
+        self._index = {}
+        self._names = []
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._lat = np.zeros(capacity, dtype=np.float64)
+        self._lng = np.zeros(capacity, dtype=np.float64)
+        self._status = np.zeros(capacity, dtype=np.int8)
+        self._charger = np.zeros(capacity, dtype=np.int8)
+        self._power = np.zeros(capacity, dtype=np.int32)
+        self._price = np.zeros(capacity, dtype=np.float64)
+        self._total_ports = np.zeros(capacity, dtype=np.int32)
+        self._available_ports = np.zeros(capacity, dtype=np.int32)
+
+    def _arrays(self):
+        return ['_ids', '_lat', '_lng', '_status', '_charger', '_power',
+                '_price', '_total_ports', '_available_ports']
+
+    def _grow(self):
+        capacity = max(len(self._ids) * 2, _INITIAL_CAPACITY)
+        for name in self._arrays():
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _write(self, i, row):
+        self._ids[i] = row['id']
+        self._lat[i] = float(row['latitude'])
+        self._lng[i] = float(row['longitude'])
+        self._status[i] = STATUS_CODES.index(row['status'])
+        self._charger[i] = CHARGER_CODES.index(row['charger_type'])
+        self._power[i] = row['power_rating']
+        self._price[i] = float(row['price_per_kwh'])
+        self._total_ports[i] = row['total_ports']
+        self._available_ports[i] = row['available_ports']
+        self._names[i] = row['name']
+
+    def _upsert(self, row):
+        i = self._index.get(row['id'])
+        if i is None:
+            if self._size == len(self._ids):
+                self._grow()
+            i = self._size
+            self._size += 1
+            self._index[row['id']] = i
+            self._names.append(None)
+        self._write(i, row)
+
+    def _remove(self, station_id):
+        i = self._index.pop(station_id, None)
+        if i is None:
+            return
+        last = self._size - 1
+        if i != last:
+            # Swap the last row into the hole to keep the arrays dense
+            for name in self._arrays():
+                array = getattr(self, name)
+                array[i] = array[last]
+            self._names[i] = self._names[last]
+            self._index[int(self._ids[i])] = i
+        self._names.pop()
+        self._size = last
+
+    def reload(self):
+        with self._lock:
+            # Read the version first so a change racing with the load
+            # leaves us stale rather than silently missing it.
+            version = get_catalog_version()
+            rows = list(ChargingStation.objects.values(*LOCATOR_FIELDS))
+            self._allocate(max(len(rows), _INITIAL_CAPACITY))
+            for row in rows:
+                self._upsert(row)
+            self._version = version
+            self._loaded = True
+
+    def reset(self):
+        with self._lock:
+            self._loaded = False
+            self._version = None
+            self._allocate(_INITIAL_CAPACITY)
+
+    def _ensure_fresh(self):
+        if not self._loaded or get_catalog_version() != self._version:
+            self.reload()
+
+    def apply(self, version, station=None, deleted_id=None):
+        """
+        Patch the snapshot after a committed change that produced ``version``.
+
+        With neither ``station`` nor ``deleted_id`` the change did not touch
+        anything the locator holds and only the version moves forward. If any
+        other change happened in between we cannot patch safely, so the
+        snapshot is dropped and rebuilt on the next query.
+        """
+        with self._lock:
+            if not self._loaded or self._version != version - 1:
+                self._loaded = False
+                return
+            if deleted_id is not None:
+                self._remove(deleted_id)
+            elif station is not None:
+                self._upsert({field: getattr(station, field) for field in LOCATOR_FIELDS})
+            self._version = version
+
+    def query(self, latitude=None, longitude=None, radius_km=None, limit=None,
+              status=None, charger_type=None):
+        """
+        Return matching stations as dicts, closest first when a centre is given.
+
+        ``status`` and ``charger_type`` accept a single code or a list of codes.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            n = self._size
+            mask = np.ones(n, dtype=bool)
+            if status:
+                mask &= self._code_mask(self._status[:n], STATUS_CODES, status)
+            if charger_type:
+                mask &= self._code_mask(self._charger[:n], CHARGER_CODES, charger_type)
+
+            distances = None
+            if latitude is not None and longitude is not None:
+                distances = self._haversine(float(latitude), float(longitude), n)
+                if radius_km is not None:
+                    mask &= distances <= radius_km
+
+            candidates = np.flatnonzero(mask)
+            if distances is not None:
+                candidate_distances = distances[candidates]
+                if limit is not None and limit < len(candidates):
+                    nearest = np.argpartition(candidate_distances, limit - 1)[:limit]
+                    candidates = candidates[nearest]
+                    candidate_distances = candidate_distances[nearest]
+                order = np.lexsort((self._ids[candidates], candidate_distances))
+                candidates = candidates[order]
+            else:
+                candidates = candidates[np.argsort(self._ids[candidates], kind='stable')]
+                if limit is not None:
+                    candidates = candidates[:limit]
+
+            return [self._record(i, distances) for i in candidates]
+
+    def snapshot(self):
+        """Copy the current columns for bulk processing outside the lock."""
+        with self._lock:
+            self._ensure_fresh()
+            n = self._size
+            return {
+                'id': self._ids[:n].copy(),
+                'latitude': self._lat[:n].copy(),
+                'longitude': self._lng[:n].copy(),
+                'status': self._status[:n].copy(),
+                'charger_type': self._charger[:n].copy(),
+                'available_ports': self._available_ports[:n].copy(),
+            }
+
+    def _code_mask(self, column, codes, wanted):
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        wanted_codes = [codes.index(code) for code in wanted if code in codes]
+        return np.isin(column, wanted_codes)
+
+    def _haversine(self, latitude, longitude, n):
+        lat1 = np.radians(latitude)
+        lat2 = np.radians(self._lat[:n])
+        dlat = lat2 - lat1
+        dlng = np.radians(self._lng[:n] - longitude)
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    def _record(self, i, distances):
+        record = {
+            'id': int(self._ids[i]),
+            'name': self._names[i],
+            'latitude': float(self._lat[i]),
+            'longitude': float(self._lng[i]),
+            'status': STATUS_CODES[self._status[i]],
+            'charger_type': CHARGER_CODES[self._charger[i]],
+            'power_rating': int(self._power[i]),
+            'price_per_kwh': float(self._price[i]),
+            'total_ports': int(self._total_ports[i]),
+            'available_ports': int(self._available_ports[i]),
+        }
+        if distances is not None:
+            record['distance'] = round(float(distances[i]), 3)
+        return record
+
+
+station_locator = StationLocator()
@@ -0,0 +1,62 @@
+# stations/management/commands/import_stations.py
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from stations.importer import FORMATS, READERS, detect_format, import_stations
+
+class Command(BaseCommand):
+    help = 'Stream stations from a CSV, JSON or NDJSON file and upsert them by external_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per bulk upsert')
+        parser.add_argument('--max-errors', type=int, default=20, help='Rejected rows to print individually')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = options['format'] or detect_format(path)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.monotonic()
+        errors_shown = 0
+
+        def on_error(row_number, message):
+            nonlocal errors_shown
+            if errors_shown < options['max_errors']:
+                self.stdout.write(self.style.WARNING(f'Row {row_number} rejected: {message}'))
+                errors_shown += 1
+
+        def on_chunk(processed, upserted, rejected):
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{processed} rows read, {upserted} upserted, {rejected} rejected '
+                f'({processed / elapsed:,.0f} rows/sec)'
+            )
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            processed, upserted, rejected = import_stations(
+                READERS[fmt](stream),
+                chunk_size=options['chunk_size'],
+                on_error=on_error,
+                on_chunk=on_chunk,
+            )
+        except ValueError as exc:
+            raise CommandError(f'Malformed {fmt} input: {exc}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nImported {upserted} stations from {processed} rows in {elapsed:.1f}s '
+                f'({processed / elapsed:,.0f} rows/sec, {rejected} rejected)'
+            )
+        )
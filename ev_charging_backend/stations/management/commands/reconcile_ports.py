@@ -0,0 +1,25 @@
+# stations/management/commands/reconcile_ports.py
+from django.core.management.base import BaseCommand, CommandError
+from stations.ports import reconcile_ports
+
+class Command(BaseCommand):
+    help = 'Recompute available_ports from active reservations and fix stations that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Drifted stations locked and updated per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        metrics = reconcile_ports(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        action = 'would fix' if metrics['dry_run'] else 'fixed'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {metrics['stations']} stations in {metrics['duration_ms']}ms, "
+                f"{action} {metrics['drifted']} "
+                f"({metrics['ports_overcounted']} ports overcounted, "
+                f"{metrics['ports_undercounted']} undercounted, max drift {metrics['max_drift']})"
+            )
+        )
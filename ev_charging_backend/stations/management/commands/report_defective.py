@@ -0,0 +1,35 @@
+# stations/management/commands/report_defective.py
+from django.core.management.base import BaseCommand, CommandError
+from payments.refunds import refund_station
+from stations.models import ChargingStation
+
+class Command(BaseCommand):
+    help = 'Mark a station defective, then cancel and refund its upcoming reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('station_id', type=int)
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations refunded per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            station = ChargingStation.objects.get(pk=options['station_id'])
+        except ChargingStation.DoesNotExist:
+            raise CommandError(f"Station {options['station_id']} does not exist")
+
+        station.status = 'defective'
+        station.save()
+
+        def on_batch(totals):
+            self.stdout.write(
+                f"{totals['cancelled']} reservations cancelled, {totals['refunded']} payments refunded"
+            )
+
+        totals = refund_station(station.pk, batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{station.name} marked defective: cancelled {totals['cancelled']} reservations, "
+                f"refunded {totals['refunded']} payments ({totals['refunded_amount']})"
+            )
+        )
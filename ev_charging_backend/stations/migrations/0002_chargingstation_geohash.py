@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:26
+
+from django.db import migrations, models
+
+from stations.geo import encode_geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    ChargingStation = apps.get_model("stations", "ChargingStation")
+    stations = list(ChargingStation.objects.only("id", "latitude", "longitude"))
+    for station in stations:
+        station.geohash = encode_geohash(station.latitude, station.longitude)
+    ChargingStation.objects.bulk_update(stations, ["geohash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stations", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chargingstation",
+            name="geohash",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=12
+            ),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:28
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_counters(apps, schema_editor):
+    ChargingStation = apps.get_model("stations", "ChargingStation")
+    StationReview = apps.get_model("stations", "StationReview")
+    totals = StationReview.objects.values("station_id").annotate(
+        total=Sum("rating"), count=Count("id")
+    )
+    for row in totals:
+        ChargingStation.objects.filter(pk=row["station_id"]).update(
+            rating_sum=row["total"], rating_count=row["count"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stations", "0002_chargingstation_geohash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chargingstation",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="chargingstation",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stations", "0003_chargingstation_rating_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chargingstation",
+            index=models.Index(
+                fields=["updated_at", "id"], name="station_updated_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stations", "0004_station_updated_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chargingstation",
+            name="external_id",
+            field=models.CharField(
+                blank=True,
+                help_text="Stable operator identifier used by import_stations",
+                max_length=100,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
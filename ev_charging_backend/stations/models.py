@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .geo import encode_geohash
 
 class ChargingStation(models.Model):
     STATION_STATUS = [
@@ -17,6 +18,10 @@ class ChargingStation(models.Model):
         ('tesla', 'Tesla Supercharger'),
     ]
 
+    external_id = models.CharField(
+        max_length=100, unique=True, null=True, blank=True,
+        help_text="Stable operator identifier used by import_stations"
+    )
     name = models.CharField(max_length=200)
     address = models.TextField()
     latitude = models.DecimalField(max_digits=10, decimal_places=8)
@@ -28,11 +33,46 @@ class ChargingStation(models.Model):
     total_ports = models.IntegerField(default=1)
     available_ports = models.IntegerField(default=1)
     amenities = models.JSONField(default=list, blank=True)
+    geohash = models.CharField(max_length=12, db_index=True, editable=False, blank=True)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'charging_stations'
+        indexes = [
+            # Keyset pagination of the station list
+            models.Index(fields=['updated_at', 'id'], name='station_updated_id_idx'),
+        ]
+    
+    # Maintained with atomic F() updates, never written back from an instance
+    COUNTER_FIELDS = ('rating_sum', 'rating_count')
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key
+                and f.name not in self.COUNTER_FIELDS
+                and f.attname not in deferred
+            ]
+            kwargs['update_fields'] = update_fields
+        
+        # Keep the spatial index in sync with the coordinates
+        if update_fields is None or {'latitude', 'longitude'} & set(update_fields):
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
+    @property
+    def average_rating(self):
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
+        return 0
         
     def __str__(self):
         return f"{self.name} - {self.address}"
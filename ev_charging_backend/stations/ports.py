@@ -0,0 +1,163 @@
+# stations/ports.py - Atomic accounting of ChargingStation.available_ports
+import time
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from reservations.availability import BLOCKING_STATUSES
+from reservations.models import Reservation
+from .broadcast import availability_message
+from .models import ChargingStation
+from .signals import availability_changed, catalog_bulk_changed, catalog_changed
+
+
+# Past this many stations one catalog bump and locator reload beats patching
+LOCATOR_PATCH_LIMIT = 100
+
+
+def _ports_changed(station_ids):
+    # update() bypasses post_save, so notify caches and live subscribers here.
+    # Re-reading inside the transaction returns the values we just wrote.
+    patch = len(station_ids) <= LOCATOR_PATCH_LIMIT
+    if not patch:
+        catalog_bulk_changed()
+    for station in ChargingStation.objects.filter(pk__in=station_ids):
+        if patch:
+            catalog_changed(station=station)
+        availability_changed(availability_message(station))
+
+
+def _per_station(counts):
+    return Case(
+        *[When(pk=station_id, then=Value(n)) for station_id, n in counts.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def claim_ports(counts):
+    """
+    Take ports with one conditional UPDATE, ``counts`` mapping station id to
+    the number wanted. All or nothing: returns False, changing nothing, when
+    any station has fewer free ports than asked.
+
+    On databases with row locks the station rows stay locked until the
+    surrounding transaction ends, which serialises concurrent bookings.
+    """
+    counts = {station_id: n for station_id, n in counts.items() if n}
+    if not counts:
+        return True
+    enough = Q()
+    for station_id, n in counts.items():
+        enough |= Q(pk=station_id, available_ports__gte=n)
+    with transaction.atomic():
+        updated = ChargingStation.objects.filter(enough).update(
+            available_ports=F('available_ports') - _per_station(counts),
+            updated_at=timezone.now(),
+        )
+        if updated != len(counts):
+            transaction.set_rollback(True)
+            return False
+        _ports_changed(list(counts))
+    return True
+
+
+def claim_port(station_id):
+    return claim_ports({station_id: 1})
+
+
+def release_ports(counts):
+    """
+    Give back ports, ``counts`` mapping station id to the number released.
+
+    All stations are updated in one statement, clamped to total_ports.
+    """
+    counts = {station_id: n for station_id, n in counts.items() if n}
+    if not counts:
+        return 0
+    with transaction.atomic():
+        updated = ChargingStation.objects.filter(pk__in=counts).update(
+            available_ports=Least(F('available_ports') + _per_station(counts), F('total_ports')),
+            updated_at=timezone.now(),
+        )
+        _ports_changed(list(counts))
+    return updated
+
+
+def release_port(station_id):
+    return release_ports({station_id: 1})
+
+
+def held_ports(station_ids=None):
+    """Ports held per station, counted from its blocking reservations in one GROUP BY."""
+    reservations = Reservation.objects.filter(status__in=BLOCKING_STATUSES)
+    if station_ids is not None:
+        reservations = reservations.filter(station_id__in=station_ids)
+    return dict(
+        reservations.order_by().values('station_id').annotate(held=Count('id')).values_list('station_id', 'held')
+    )
+
+
+def _expected_free(total_ports, held):
+    return max(total_ports - held, 0)
+
+
+def reconcile_ports(batch_size=1000, dry_run=False):
+    """
+    Reset available_ports to total_ports minus the ports held by reservations.
+
+    A lock-free pass finds candidate stations from one GROUP BY and a single
+    scan of the station counters. Each batch of candidates is then locked and
+    recounted before ``bulk_update``, so bookings committing meanwhile are
+    never overwritten and the job can run as often as needed.
+
+    Returns drift metrics for monitoring.
+    """
+    started = time.monotonic()
+    held = held_ports()
+    stations = 0
+    candidates = []
+    for pk, total_ports, available_ports in ChargingStation.objects.order_by().values_list(
+        'id', 'total_ports', 'available_ports'
+    ).iterator(chunk_size=10000):
+        stations += 1
+        if available_ports != _expected_free(total_ports, held.get(pk, 0)):
+            candidates.append(pk)
+
+    drifted = over = under = max_drift = 0
+    for i in range(0, len(candidates), batch_size):
+        batch_ids = candidates[i:i + batch_size]
+        with transaction.atomic():
+            batch = list(
+                ChargingStation.objects.select_for_update().filter(pk__in=batch_ids)
+                .only('id', 'total_ports', 'available_ports')
+            )
+            held_now = held_ports(batch_ids)
+            changed = []
+            for station in batch:
+                expected = _expected_free(station.total_ports, held_now.get(station.pk, 0))
+                drift = station.available_ports - expected
+                if not drift:
+                    continue
+                over += max(drift, 0)
+                under += max(-drift, 0)
+                max_drift = max(max_drift, abs(drift))
+                station.available_ports = expected
+                station.updated_at = timezone.now()
+                changed.append(station)
+            drifted += len(changed)
+            if changed and not dry_run:
+                ChargingStation.objects.bulk_update(changed, ['available_ports', 'updated_at'])
+                _ports_changed([station.pk for station in changed])
+
+    return {
+        'stations': stations,
+        'drifted': drifted,
+        'ports_overcounted': over,
+        'ports_undercounted': under,
+        'max_drift': max_drift,
+        'dry_run': dry_run,
+        'duration_ms': round((time.monotonic() - started) * 1000),
+    }
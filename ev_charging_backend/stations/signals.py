@@ -0,0 +1,86 @@
+# stations/signals.py - Keep station caches and live subscribers in sync with the database
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .broadcast import availability_message, publish_availability
+from .catalog import bump_catalog_version
+from .locator import station_locator
+from .models import ChargingStation, StationReview
+
+
+def catalog_changed(station=None, deleted_id=None):
+    """
+    Record a station catalog change once the current transaction commits.
+
+    Call this from code paths that bypass ``save()``, such as queryset
+    ``update()`` calls, so ETags and the in-process locator stay correct.
+    """
+    def on_commit():
+        station_locator.apply(bump_catalog_version(), station=station, deleted_id=deleted_id)
+    transaction.on_commit(on_commit)
+
+
+def catalog_bulk_changed():
+    """
+    Record a change to many stations, e.g. a bulk import, after commit.
+
+    The version bump alone makes every worker's locator reload its snapshot.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def availability_changed(message):
+    """Push an availability delta to stream subscribers after commit."""
+    transaction.on_commit(lambda: publish_availability(message), robust=True)
+
+
+@receiver(post_save, sender=ChargingStation)
+def station_saved(sender, instance, **kwargs):
+    catalog_changed(station=instance)
+    availability_changed(availability_message(instance))
+
+
+@receiver(post_delete, sender=ChargingStation)
+def station_deleted(sender, instance, **kwargs):
+    catalog_changed(deleted_id=instance.pk)
+    availability_changed(availability_message(instance, deleted=True))
+
+
+def _count_rating(station_id, rating, sign):
+    station = ChargingStation.objects.filter(pk=station_id)
+    if sign < 0:
+        station = station.filter(rating_count__gt=0)
+    station.update(
+        rating_sum=F('rating_sum') + sign * rating,
+        rating_count=F('rating_count') + sign,
+    )
+
+
+@receiver(pre_save, sender=StationReview)
+def review_saving(sender, instance, **kwargs):
+    # What the station counters include for this review before the save
+    instance._counted = None if instance._state.adding else StationReview.objects.filter(
+        pk=instance.pk
+    ).values_list('station_id', 'rating').first()
+
+
+@receiver(post_save, sender=StationReview)
+def review_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'station', 'rating'} & set(update_fields):
+        return
+    counted = getattr(instance, '_counted', None)
+    current = (instance.station_id, instance.rating)
+    if counted == current:
+        return
+    if counted:
+        _count_rating(*counted, -1)
+    _count_rating(*current, 1)
+    catalog_changed()
+
+
+@receiver(post_delete, sender=StationReview)
+def review_deleted(sender, instance, **kwargs):
+    _count_rating(instance.station_id, instance.rating, -1)
+    catalog_changed()
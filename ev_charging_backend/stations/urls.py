@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ChargingStationViewSet
+from .views import ChargingStationViewSet, availability_stream
 
 router = DefaultRouter()
 router.register(r'', ChargingStationViewSet, basename='chargingstation')
 
 urlpatterns = [
+    path('stream/', availability_stream, name='station-availability-stream'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
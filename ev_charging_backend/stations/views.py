@@ -1,29 +1,312 @@
-from rest_framework import viewsets
-from rest_framework.permissions import AllowAny
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import ChargingStation
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from ev_charging_backend.pagination import KeysetPagination
+from ev_charging_backend.params import parse_time
+from payments.refunds import refund_station
+from reservations.availability import MAX_SLOT_DURATION, station_availability
+from .broadcast import broadcaster
+from .catalog import catalog_etag
+from .clusters import MAX_ZOOM, get_clusters
+from .geo import find_nearby
+from .locator import station_locator
+from .models import ChargingStation, StationReview
+from .ports import reconcile_ports
+from .serializers import (
+    ChargingStationSerializer, NearbyStationSerializer, StationReviewSerializer,
+    recent_reviews_prefetch,
+)
+
+MAX_NEARBY_RADIUS_KM = 500
+MAX_NEARBY_LIMIT = 500
+STREAM_KEEPALIVE_SECONDS = 25
+MAX_AVAILABILITY_WINDOW = timedelta(days=7)
 
 class ChargingStationViewSet(viewsets.ModelViewSet):
     queryset = ChargingStation.objects.all()
-    permission_classes = [AllowAny]
-    
-    def get_serializer_class(self):
-        from rest_framework import serializers
-        
-        class ChargingStationSerializer(serializers.ModelSerializer):
-            class Meta:
-                model = ChargingStation
-                fields = '__all__'
-        
-        return ChargingStationSerializer
-    
+    serializer_class = ChargingStationSerializer
+    pagination_class = KeysetPagination
+
+    def get_requested_fields(self):
+        if self.action not in ['list', 'retrieve']:
+            return None
+        return ChargingStationSerializer.parse_fields(self.request.query_params.get('fields'))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            fields = self.get_requested_fields()
+            if fields is None or 'recent_reviews' in fields:
+                queryset = queryset.prefetch_related(recent_reviews_prefetch())
+            if fields is not None:
+                columns = ChargingStationSerializer.columns_for(fields)
+                columns.update(self.paginator.get_ordering_fields())
+                queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    # Catalog reads answer If-None-Match with 304 before touching the database
+    @method_decorator(etag(catalog_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(etag(catalog_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve', 'nearby', 'map', 'clusters', 'availability']:
+            permission_classes = [AllowAny]
+        elif self.action in ['reconcile_ports', 'report_defective']:
+            permission_classes = [IsAdminUser]
+        else:
+            permission_classes = [IsAuthenticated]
+        return [permission() for permission in permission_classes]
+
     @action(detail=False, methods=['get'])
+    @method_decorator(etag(catalog_etag))
     def nearby(self, request):
         lat = request.query_params.get('lat')
         lng = request.query_params.get('lng')
-        radius = float(request.query_params.get('radius', 10))
-        
-        stations = ChargingStation.objects.filter(status='active')
-        serializer = self.get_serializer(stations, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+
+        if not lat or not lng:
+            return Response({'error': 'lat and lng parameters required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            lat = float(lat)
+            lng = float(lng)
+            radius = float(request.query_params.get('radius', 10))
+            limit = request.query_params.get('limit')
+            limit = int(limit) if limit else None
+        except ValueError:
+            return Response({'error': 'lat, lng, radius and limit must be numbers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({'error': 'lat/lng out of range'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius <= MAX_NEARBY_RADIUS_KM:
+            return Response({'error': f'radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if limit is not None and not 0 < limit <= MAX_NEARBY_LIMIT:
+            return Response({'error': f'limit must be between 1 and {MAX_NEARBY_LIMIT}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        stations = find_nearby(
+            ChargingStation.objects.filter(status='active'),
+            lat, lng, radius, limit=limit
+        )
+        prefetch_related_objects(stations, recent_reviews_prefetch())
+
+        serializer = NearbyStationSerializer(stations, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(etag(catalog_etag))
+    def map(self, request):
+        """Compact station markers served from the in-process locator, no SQL."""
+        params = request.query_params
+        lat = params.get('lat')
+        lng = params.get('lng')
+        try:
+            lat = float(lat) if lat else None
+            lng = float(lng) if lng else None
+            radius = float(params['radius']) if params.get('radius') else None
+            limit = int(params['limit']) if params.get('limit') else None
+        except ValueError:
+            return Response({'error': 'lat, lng, radius and limit must be numbers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        if (lat is None) != (lng is None):
+            return Response({'error': 'lat and lng must be given together'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if radius is not None and lat is None:
+            return Response({'error': 'radius requires lat and lng'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if limit is not None and limit <= 0:
+            return Response({'error': 'limit must be positive'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        stations = station_locator.query(
+            latitude=lat,
+            longitude=lng,
+            radius_km=radius,
+            limit=limit,
+            status=params.getlist('status'),
+            charger_type=params.getlist('charger_type'),
+        )
+        return Response(stations)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(etag(catalog_etag))
+    def clusters(self, request):
+        """Grid clusters for a map viewport, ?bbox=min_lng,min_lat,max_lng,max_lat&zoom="""
+        try:
+            bbox = parse_bbox(request.query_params.get('bbox', ''))
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            return Response({'error': 'bbox (min_lng,min_lat,max_lng,max_lat) and zoom are required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= zoom <= MAX_ZOOM:
+            return Response({'error': f'zoom must be between 0 and {MAX_ZOOM}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            clusters = get_clusters(bbox, zoom)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'zoom': zoom, 'clusters': clusters})
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """Free ports over [from, to) and slots of at least ?duration= minutes."""
+        station = self.get_object()
+        now = timezone.now()
+        try:
+            window_start = parse_time(request.query_params.get('from')) or now
+            window_end = parse_time(request.query_params.get('to')) or window_start + timedelta(days=1)
+            duration = timedelta(minutes=int(request.query_params.get('duration', 60)))
+        except (OverflowError, ValueError):
+            return Response({'error': 'from/to must be ISO 8601 datetimes and duration a number of minutes'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        # Nothing can be booked in the past
+        window_start = max(window_start, now)
+        if window_end <= window_start:
+            return Response({'error': 'to must be after from and in the future'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if window_end - window_start > MAX_AVAILABILITY_WINDOW:
+            return Response({'error': f'window cannot exceed {MAX_AVAILABILITY_WINDOW.days} days'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not timedelta(0) < duration <= MAX_SLOT_DURATION:
+            return Response({'error': f'duration must be between 1 and {MAX_SLOT_DURATION // timedelta(minutes=1)} minutes'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        result = station_availability(station, window_start, window_end, duration)
+        as_text = serializers.DateTimeField().to_representation
+        return Response({
+            'station': station.id,
+            'status': station.status,
+            'total_ports': station.total_ports,
+            'from': as_text(window_start),
+            'to': as_text(window_end),
+            'duration': int(duration.total_seconds() // 60),
+            'timeline': [
+                {**segment, 'start': as_text(segment['start']), 'end': as_text(segment['end'])}
+                for segment in result['timeline']
+            ],
+            'slots': [
+                {'start': as_text(slot['start']), 'end': as_text(slot['end'])}
+                for slot in result['slots']
+            ],
+        })
+
+    @action(detail=False, methods=['post'], url_path='reconcile-ports')
+    def reconcile_ports(self, request):
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        return Response(reconcile_ports(dry_run=dry_run))
+
+    @action(detail=True, methods=['post'])
+    def report_defective(self, request, pk=None):
+        station = self.get_object()
+        station.status = 'defective'
+        station.save()
+        # Upcoming bookings cannot be honoured: cancel and refund them in bulk
+        totals = refund_station(station.pk)
+        return Response({
+            'message': 'Station reported as defective',
+            'cancelled': totals['cancelled'],
+            'refunded': totals['refunded'],
+            'refunded_amount': str(totals['refunded_amount']),
+        })
+
+    @action(detail=True, methods=['post'])
+    def add_review(self, request, pk=None):
+        station = self.get_object()
+
+        # Check if user already reviewed this station
+        existing_review = StationReview.objects.filter(
+            station=station,
+            user=request.user
+        ).first()
+
+        if existing_review:
+            return Response(
+                {'error': 'You have already reviewed this station'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = StationReviewSerializer(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                # The StationReview signals keep the station's rating counters
+                serializer.save(user=request.user, station=station)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get'])
+    def reviews(self, request, pk=None):
+        station = self.get_object()
+        reviews = StationReview.objects.filter(station=station).order_by('-created_at')
+        serializer = StationReviewSerializer(reviews, many=True)
+        return Response(serializer.data)
+
+
+def parse_bbox(value):
+    """Parse 'min_lng,min_lat,max_lng,max_lat' into floats, or raise ValueError."""
+    min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(','))
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValueError('bbox minimums must not exceed maximums')
+    return min_lng, min_lat, max_lng, max_lat
+
+
+async def availability_stream(request):
+    """
+    Server-Sent Events stream of {station_id, available_ports, status} deltas.
+
+    Served natively by the ASGI application: each idle client is a parked
+    coroutine with a coalescing buffer, not a worker thread. Pass
+    ?bbox=min_lng,min_lat,max_lng,max_lat to only receive stations in view.
+    """
+    bbox = request.GET.get('bbox')
+    if bbox:
+        try:
+            bbox = parse_bbox(bbox)
+        except ValueError:
+            return JsonResponse({'error': 'bbox must be min_lng,min_lat,max_lng,max_lat'}, status=400)
+    else:
+        bbox = None
+
+    async def events():
+        subscription = broadcaster.subscribe(bbox)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                batch = await subscription.next_batch(timeout=STREAM_KEEPALIVE_SECONDS)
+                if batch:
+                    yield f'event: availability\ndata: {json.dumps(batch)}\n\n'
+                else:
+                    yield ': keepalive\n\n'
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
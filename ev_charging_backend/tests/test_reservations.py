@@ -1,13 +1,36 @@
 # tests/test_reservations.py - Critical module testing
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import ProtectedError, QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 from stations.models import ChargingStation
-from reservations.models import Reservation
-from payments.models import Payment
+from reservations.models import ArchivedReservation, Reservation, StationHourlyRollup
+from reservations.rollups import refresh_rollups
+from reservations.suggest import BOOKING_LEAD_TIME, first_bookable_start, suggest_slots
+from reservations.tasks import ReservationScheduler, close_batch, overdue_reservations
+from payments.gateway import GatewayDeclined, GatewayError, LocalGateway
+from payments.ledger import rebuild_balances
+from payments.revenue import refresh_revenue
+from payments.models import LedgerEntry, Payment, Refund, StationBalance, UserBalance
+from payments.processing import PaymentProcessor, charge_payment, claim_payments
+from payments.refunds import refund_station
 
 class ReservationAPITestCase(APITestCase):
     def setUp(self):
@@ -97,6 +120,67 @@ class ReservationAPITestCase(APITestCase):
         reservation.refresh_from_db()
         self.assertEqual(reservation.status, 'cancelled')
 
+class ReservationOccupancyTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='occupancy@test.com',
+            email='occupancy@test.com',
+            password='testpassword123'
+        )
+        self.other = User.objects.create_user(
+            username='other@test.com',
+            email='other@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.station = ChargingStation.objects.create(
+            name='Two Port Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=2,
+            available_ports=2,
+            status='active'
+        )
+        self.base = timezone.now() + timedelta(days=1)
+
+    def book(self, user, start_hour, end_hour):
+        return Reservation.objects.create(
+            user=user,
+            station=self.station,
+            start_time=self.base + timedelta(hours=start_hour),
+            end_time=self.base + timedelta(hours=end_hour),
+            estimated_cost=50.00,
+            status='confirmed'
+        )
+
+    def request_booking(self, start_hour, end_hour):
+        return self.client.post('/api/reservations/', {
+            'station': self.station.id,
+            'start_time': (self.base + timedelta(hours=start_hour)).isoformat(),
+            'end_time': (self.base + timedelta(hours=end_hour)).isoformat(),
+            'estimated_cost': 100.00
+        })
+
+    def test_sequential_bookings_leave_a_port_free(self):
+        """Test two non-overlapping bookings only occupy one port at a time"""
+        self.book(self.other, 0, 2)
+        self.book(self.other, 2, 4)
+        self.book(self.other, 5, 6)
+        # A raw overlap count would see 3 bookings against 2 ports
+        response = self.request_booking(0, 6)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_full_window_is_rejected(self):
+        """Test booking fails when every port is held at some instant"""
+        self.book(self.other, 0, 2)
+        self.book(self.user, 1, 3)
+        response = self.request_booking(1, 2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class PaymentAPITestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -160,4 +244,1211 @@ class PaymentAPITestCase(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         payment.refresh_from_db()
-        self.assertEqual(payment.status, 'refunded')
\ No newline at end of file
+        self.assertEqual(payment.status, 'refunded')
+
+class StationAvailabilityTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='availability@test.com',
+            email='availability@test.com',
+            password='testpassword123'
+        )
+        self.station = ChargingStation.objects.create(
+            name='Availability Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=2,
+            available_ports=2,
+            status='active'
+        )
+        self.base = (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    def book(self, start_hour, end_hour, status='confirmed'):
+        return Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=self.base + timedelta(hours=start_hour),
+            end_time=self.base + timedelta(hours=end_hour),
+            estimated_cost=50.00,
+            status=status
+        )
+
+    def get_availability(self, duration=60):
+        return self.client.get(f'/api/stations/{self.station.id}/availability/', {
+            'from': self.base.isoformat(),
+            'to': (self.base + timedelta(hours=6)).isoformat(),
+            'duration': duration,
+        })
+
+    def test_sweep_finds_windows_with_a_free_port(self):
+        """Test slots exclude periods where every port is booked"""
+        self.book(1, 3)
+        self.book(2, 4)
+        self.book(0, 6, status='cancelled')  # Does not hold a port
+
+        response = self.get_availability()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ports = [segment['available_ports'] for segment in response.data['timeline']]
+        self.assertEqual(ports, [2, 1, 0, 1, 2])
+        self.assertEqual(len(response.data['slots']), 2)  # 0h-2h and 3h-6h
+
+        response = self.get_availability(duration=150)
+        self.assertEqual(len(response.data['slots']), 1)
+
+    def test_cache_invalidated_when_reservation_changes(self):
+        """Test a new booking is visible on the next availability call"""
+        self.get_availability()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(0, 6)
+            self.book(0, 6)
+        response = self.get_availability()
+        self.assertEqual(response.data['slots'], [])
+
+    def test_out_of_range_durations_are_rejected(self):
+        """Test zero, oversized and overflowing durations return 400"""
+        for duration in (0, -5, 24 * 60 + 1, 10 ** 20, 'soon'):
+            response = self.get_availability(duration=duration)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, duration)
+
+class ReservationExpiryTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='expiry@test.com',
+            email='expiry@test.com',
+            password='testpassword123'
+        )
+        self.station = ChargingStation.objects.create(
+            name='Expiry Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=4,
+            available_ports=0,
+            status='active'
+        )
+        self.now = timezone.now()
+
+    def book(self, start, end, status):
+        return Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=self.now + start,
+            end_time=self.now + end,
+            estimated_cost=50.00,
+            status=status
+        )
+
+    def test_due_reservations_closed_in_bulk(self):
+        """Test no-shows expire, ended sessions complete and ports are freed once"""
+        no_shows = [self.book(timedelta(hours=-1), timedelta(hours=1), 'confirmed') for _ in range(2)]
+        grace = self.book(timedelta(minutes=-5), timedelta(hours=1), 'pending')
+        ended = self.book(timedelta(hours=-3), timedelta(hours=-1), 'active')
+        cancelled = self.book(timedelta(hours=-1), timedelta(hours=1), 'cancelled')
+
+        call_command('cleanup_reservations', batch_size=2, stdout=StringIO())
+
+        statuses = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[r.id] for r in no_shows], ['expired', 'expired'])
+        self.assertEqual(statuses[grace.id], 'pending')
+        self.assertEqual(statuses[ended.id], 'completed')
+        self.assertEqual(statuses[cancelled.id], 'cancelled')
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.available_ports, 3)
+
+    def test_reservation_cancelled_during_batch_keeps_its_status(self):
+        """Test a cancel landing between the batch SELECT and UPDATE is not overwritten"""
+        no_show = self.book(timedelta(hours=-1), timedelta(hours=1), 'confirmed')
+        raced = self.book(timedelta(hours=-1), timedelta(hours=1), 'confirmed')
+        update = QuerySet.update
+
+        def cancel_first(queryset, **kwargs):
+            if kwargs.get('status') == 'expired':
+                update(Reservation.objects.filter(pk=raced.pk), status='cancelled')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', cancel_first):
+            closed = close_batch(overdue_reservations(self.now), 'expired', 10)
+
+        self.assertEqual(closed, 1)
+        statuses = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual((statuses[no_show.id], statuses[raced.id]), ('expired', 'cancelled'))
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.available_ports, 1)
+
+    def test_scheduler_sleeps_until_next_deadline(self):
+        """Test the scheduler wakes at the earliest deadline and closes it"""
+        session = self.book(timedelta(hours=-1), timedelta(seconds=10), 'active')
+        scheduler = ReservationScheduler(refresh=60)
+
+        wake_at = scheduler.tick(self.now)
+        self.assertEqual(wake_at, session.end_time)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'active')
+
+        wake_at = scheduler.tick(session.end_time + timedelta(seconds=1))
+        self.assertEqual(wake_at, scheduler.next_refresh)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'completed')
+
+class BulkReservationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='fleet@test.com',
+            email='fleet@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.stations = [
+            ChargingStation.objects.create(
+                name=f'Fleet Station {i}',
+                address='Test Address, Casablanca',
+                latitude=33.5731,
+                longitude=-7.5898,
+                charger_type='type2',
+                power_rating=22,
+                price_per_kwh=2.50,
+                total_ports=2,
+                available_ports=2,
+                status='active'
+            )
+            for i in range(2)
+        ]
+        self.base = timezone.now() + timedelta(days=1)
+
+    def slot(self, station, start_hour, end_hour):
+        return {
+            'station': station.id,
+            'start_time': (self.base + timedelta(hours=start_hour)).isoformat(),
+            'end_time': (self.base + timedelta(hours=end_hour)).isoformat(),
+            'estimated_cost': 50.00
+        }
+
+    def test_results_reported_per_item(self):
+        """Test valid slots are booked and the rest rejected with reasons"""
+        station = self.stations[0]
+        items = [
+            self.slot(station, 0, 2),
+            self.slot(station, 1, 3),
+            self.slot(station, 1, 2),  # Both ports already claimed by this batch
+            self.slot(station, 3, 2),
+            {**self.slot(station, 0, 1), 'station': 0},
+        ]
+        response = self.client.post('/api/reservations/bulk/', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created', 'created', 'rejected', 'rejected', 'rejected']
+        )
+        self.assertEqual(response.data['results'][0]['reservation']['station_name'], station.name)
+
+        station.refresh_from_db()
+        self.assertEqual(station.available_ports, 0)
+        self.assertEqual(Reservation.objects.filter(user=self.user).count(), 2)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """Test a batch costs the same number of queries whatever its size"""
+        def run(items):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/reservations/bulk/', {'reservations': items}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        small = run([self.slot(station, 0, 1) for station in self.stations])
+        large = run([self.slot(station, 2, 3) for station in self.stations])
+        self.assertEqual(small, large)
+        ChargingStation.objects.update(total_ports=10, available_ports=10)
+        larger = run([self.slot(station, hour, hour + 1) for station in self.stations for hour in range(4, 10)])
+        self.assertEqual(larger, small)
+
+class ReservationArchiveTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='history@test.com',
+            email='history@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.station = ChargingStation.objects.create(
+            name='History Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=2,
+            available_ports=2,
+            status='active'
+        )
+        self.now = timezone.now()
+
+    def book(self, days_ago, status):
+        start_time = self.now - timedelta(days=days_ago)
+        reservation = Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=start_time,
+            end_time=start_time + timedelta(hours=1),
+            estimated_cost=50.00,
+            status=status
+        )
+        Reservation.objects.filter(pk=reservation.pk).update(created_at=start_time - timedelta(days=1))
+        return reservation
+
+    def test_old_terminal_reservations_are_archived(self):
+        """Test only finished reservations past the cutoff move, keeping their payments"""
+        paid = self.book(100, 'completed')
+        payment = Payment.objects.create(
+            user=self.user, reservation=paid, amount=50.00, payment_method='card', status='completed'
+        )
+        cancelled = self.book(60, 'cancelled')
+        recent = self.book(5, 'completed')
+        stale = self.book(60, 'pending')
+
+        call_command('archive_reservations', days=30, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(set(Reservation.objects.values_list('id', flat=True)), {recent.id, stale.id})
+        self.assertEqual(set(ArchivedReservation.objects.values_list('id', flat=True)), {paid.id, cancelled.id})
+        payment.refresh_from_db()
+        self.assertIsNone(payment.reservation_id)
+        self.assertEqual(payment.archived_reservation_id, paid.id)
+
+    def test_history_merges_archived_reservations(self):
+        """Test archived rows are only listed when history is requested"""
+        old = self.book(100, 'completed')
+        recent = self.book(5, 'completed')
+        call_command('archive_reservations', days=30, stdout=StringIO())
+
+        response = self.client.get('/api/reservations/')
+        self.assertEqual([item['id'] for item in response.data['results']], [recent.id])
+
+        response = self.client.get('/api/reservations/', {'history': 'true'})
+        self.assertEqual([item['id'] for item in response.data['results']], [recent.id, old.id])
+        self.assertEqual(response.data['results'][1]['station_name'], 'History Station')
+
+        self.assertEqual(self.client.get(f'/api/reservations/{old.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f'/api/reservations/{old.id}/', {'history': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'completed')
+
+class SlotSuggestionTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='suggest@test.com',
+            email='suggest@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.now = timezone.now()
+
+    def make_station(self, name, longitude, total_ports=1, charger_type='ccs'):
+        return ChargingStation.objects.create(
+            name=name,
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=longitude,
+            charger_type=charger_type,
+            power_rating=50,
+            price_per_kwh=3.00,
+            total_ports=total_ports,
+            available_ports=total_ports,
+            status='active'
+        )
+
+    def book(self, station, start_hour, end_hour):
+        Reservation.objects.create(
+            user=self.user,
+            station=station,
+            start_time=self.now + timedelta(hours=start_hour),
+            end_time=self.now + timedelta(hours=end_hour),
+            estimated_cost=50.00,
+            status='confirmed'
+        )
+
+    def test_ranked_by_start_then_distance(self):
+        """Test free stations come first by distance, busy ones when they free up"""
+        busy = self.make_station('Busy', -7.5898)
+        near = self.make_station('Near', -7.58)
+        far = self.make_station('Far', -7.56)
+        self.make_station('Wrong plug', -7.585, charger_type='type2')
+        self.book(busy, -1, 3)
+
+        response = self.client.get('/api/reservations/suggest/', {
+            'lat': 33.5731, 'lng': -7.5898, 'radius': 5, 'charger_type': 'ccs', 'duration': 90
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['station'] for item in response.data], [near.id, far.id, busy.id])
+        self.assertEqual(response.data[2]['distance'], 0.0)
+
+    def test_window_needs_a_port_for_the_whole_duration(self):
+        """Test short gaps are skipped and the search costs two queries"""
+        station = self.make_station('Two Ports', -7.5898, total_ports=2)
+        self.book(station, 0, 2)
+        self.book(station, 1, 3)
+
+        with self.assertNumQueries(2):
+            suggestions = suggest_slots(33.5731, -7.5898, 5, timedelta(hours=2), now=self.now)
+        self.assertEqual(suggestions[0]['start_time'], self.now + timedelta(hours=2))
+
+        suggestions = suggest_slots(33.5731, -7.5898, 5, timedelta(minutes=30), now=self.now)
+        self.assertEqual(suggestions[0]['start_time'], first_bookable_start(self.now))
+
+    def test_free_stations_are_suggested_a_bookable_start(self):
+        """Test an idle station's slot starts on a boundary after the lead time, not now"""
+        station = self.make_station('Idle', -7.5898)
+        now = self.now.replace(hour=10, minute=3, second=20)
+        suggestion, = suggest_slots(33.5731, -7.5898, 5, timedelta(minutes=30), now=now)
+        self.assertEqual(suggestion['station'], station)
+        self.assertEqual(suggestion['start_time'], now.replace(minute=10, second=0, microsecond=0))
+        self.assertGreaterEqual(suggestion['start_time'] - now, BOOKING_LEAD_TIME)
+
+    def test_out_of_range_durations_are_rejected(self):
+        """Test zero, oversized and overflowing durations return 400"""
+        for duration in (0, 24 * 60 + 1, 10 ** 20):
+            response = self.client.get('/api/reservations/suggest/', {
+                'lat': 33.5731, 'lng': -7.5898, 'duration': duration
+            })
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, duration)
+
+class ListingQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='lists@test.com',
+            email='lists@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.stations = [
+            ChargingStation.objects.create(
+                name=f'List Station {i}',
+                address='Test Address, Casablanca',
+                latitude=33.5731,
+                longitude=-7.5898,
+                charger_type='type2',
+                power_rating=22,
+                price_per_kwh=2.50,
+                total_ports=4,
+                available_ports=4,
+                status='active'
+            )
+            for i in range(3)
+        ]
+        start_time = timezone.now() - timedelta(days=120)
+        for i in range(6):
+            reservation = Reservation.objects.create(
+                user=self.user,
+                station=self.stations[i % 3],
+                start_time=start_time + timedelta(days=i),
+                end_time=start_time + timedelta(days=i, hours=1),
+                estimated_cost=50.00,
+                status='completed'
+            )
+            Payment.objects.create(
+                user=self.user, reservation=reservation, amount=50.00, payment_method='card', status='completed'
+            )
+
+    def test_reservation_list_is_one_query(self):
+        """Test listing reservations joins the station instead of one query per row"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reservations/', {'page_size': 4})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(response.data['results'][0]['station_name'], 'List Station 2')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_history_pages_across_both_tables(self):
+        """Test history pages merge the live and archived tables in order"""
+        call_command('archive_reservations', days=117, stdout=StringIO())
+        self.assertEqual(ArchivedReservation.objects.count(), 3)
+
+        ids = []
+        url = '/api/reservations/?history=true&page_size=4'
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 6)
+
+    def test_payment_list_is_one_query(self):
+        """Test payment details come from a join, archived reservations included"""
+        call_command('archive_reservations', days=117, stdout=StringIO())
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/payments/')
+        details = [item['reservation_details'] for item in response.data['results']]
+        self.assertEqual(len(details), 6)
+        self.assertTrue(all(detail['station_name'].startswith('List Station') for detail in details))
+
+class HourlyRollupTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rollup@test.com',
+            email='rollup@test.com',
+            password='testpassword123'
+        )
+        self.admin = User.objects.create_superuser(username='ops@test.com', password='testpassword123')
+        self.station = ChargingStation.objects.create(
+            name='Rollup Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=2,
+            available_ports=2,
+            status='active'
+        )
+        self.base = (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    def book(self, start_minutes, end_minutes, status='confirmed'):
+        return Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=self.base + timedelta(minutes=start_minutes),
+            end_time=self.base + timedelta(minutes=end_minutes),
+            estimated_cost=50.00,
+            status=status
+        )
+
+    def buckets(self):
+        return {
+            row.hour: (row.occupancy_minutes, row.bookings, row.cancellations, row.expiries)
+            for row in StationHourlyRollup.objects.filter(station=self.station)
+        }
+
+    def test_changes_are_folded_in_incrementally(self):
+        """Test each run only applies what changed since the previous one"""
+        first = self.book(30, 90)
+        self.book(60, 120)
+        refresh_rollups()
+        next_hour = self.base + timedelta(hours=1)
+        self.assertEqual(self.buckets(), {self.base: (30.0, 1, 0, 0), next_hour: (90.0, 1, 0, 0)})
+
+        first.status = 'cancelled'
+        first.save()
+        self.assertEqual(refresh_rollups()['changed'], 1)
+        self.assertEqual(self.buckets(), {self.base: (0.0, 1, 1, 0), next_hour: (60.0, 1, 0, 0)})
+
+        # Nothing new: rows inside the overlap window are re-read but unchanged
+        self.assertEqual(refresh_rollups()['changed'], 0)
+        self.assertEqual(self.buckets()[next_hour], (60.0, 1, 0, 0))
+
+    def test_analytics_reads_rollups(self):
+        """Test the operator endpoint reports utilization per hour and per weekday"""
+        self.book(0, 60)
+        self.book(0, 30)
+        refresh_rollups()
+        params = {
+            'from': self.base.isoformat(),
+            'to': (self.base + timedelta(hours=2)).isoformat(),
+            'station': str(self.station.id),
+        }
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/reservations/analytics/', params).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/reservations/analytics/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['capacity_ports'], 2)
+        bucket, = response.data['buckets']
+        self.assertEqual(bucket['bookings'], 2)
+        self.assertEqual(bucket['utilization'], 0.75)
+
+        response = self.client.get('/api/reservations/analytics/', {**params, 'group': 'weekday_hour'})
+        bucket, = response.data['buckets']
+        local = timezone.localtime(self.base)
+        self.assertEqual((bucket['weekday'], bucket['hour_of_day']), (local.isoweekday(), local.hour))
+        self.assertEqual(bucket['utilization'], 0.75)
+
+class IdempotencyKeyTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='retry@test.com',
+            email='retry@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.station = ChargingStation.objects.create(
+            name='Retry Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=4,
+            available_ports=4,
+            status='active'
+        )
+        start_time = timezone.now() + timedelta(hours=1)
+        self.data = {
+            'station': self.station.id,
+            'start_time': start_time.isoformat(),
+            'end_time': (start_time + timedelta(hours=2)).isoformat(),
+            'estimated_cost': 125.00
+        }
+
+    def test_retried_reservation_is_created_once(self):
+        """Test a retried POST with the same key replays the first response"""
+        first = self.client.post('/api/reservations/', self.data, HTTP_IDEMPOTENCY_KEY='booking-1')
+        retry = self.client.post('/api/reservations/', self.data, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+        self.assertEqual(Reservation.objects.filter(user=self.user).count(), 1)
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.available_ports, 3)
+
+        # A new key is a new booking
+        other = self.client.post('/api/reservations/', self.data, HTTP_IDEMPOTENCY_KEY='booking-2')
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(other.data['id'], first.data['id'])
+
+    def test_key_reused_for_different_body_is_rejected(self):
+        """Test reusing a key with another payload is refused"""
+        self.client.post('/api/reservations/', self.data, HTTP_IDEMPOTENCY_KEY='booking-1')
+        response = self.client.post('/api/reservations/', {**self.data, 'estimated_cost': 99.00},
+                                    HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Reservation.objects.filter(user=self.user).count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        """Test another user's key does not replay someone else's response"""
+        self.client.post('/api/reservations/', self.data, HTTP_IDEMPOTENCY_KEY='booking-1')
+        other = User.objects.create_user(username='other@test.com', password='testpassword123')
+        self.client.force_authenticate(user=other)
+        response = self.client.post('/api/reservations/', self.data, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_retried_payment_is_charged_once(self):
+        """Test a retried payment does not create a second charge"""
+        reservation = Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=timezone.now() + timedelta(hours=1),
+            end_time=timezone.now() + timedelta(hours=3),
+            estimated_cost=125.00,
+            status='pending'
+        )
+        data = {'reservation': reservation.id, 'amount': 125.00, 'payment_method': 'card'}
+        first = self.client.post('/api/payments/', data, HTTP_IDEMPOTENCY_KEY='pay-1')
+        retry = self.client.post('/api/payments/', data, HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Payment.objects.filter(reservation=reservation).count(), 1)
+
+class PaymentReconciliationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='finance@test.com',
+            email='finance@test.com',
+            password='testpassword123'
+        )
+        for transaction_id, amount, payment_status in [
+            ('TXN-A', '100.00', 'completed'),
+            ('TXN-B', '50.00', 'refunded'),
+            ('TXN-C', '30.00', 'completed'),
+            ('TXN-D', '40.00', 'completed'),
+            ('TXN-F', '60.00', 'failed'),
+        ]:
+            payment = Payment.objects.create(
+                user=self.user,
+                amount=amount,
+                payment_method='card',
+                status=payment_status,
+                transaction_id=transaction_id
+            )
+        Refund.objects.create(payment=Payment.objects.get(transaction_id='TXN-B'), reason='user_cancelled',
+                              amount='20.00', status='completed')
+        self.lines = [
+            {'transaction_id': 'TXN-A', 'type': 'charge', 'amount': '100.00', 'currency': 'MAD'},
+            {'transaction_id': 'TXN-B', 'type': 'charge', 'amount': '50.00', 'currency': 'MAD'},
+            {'transaction_id': 'TXN-B', 'type': 'refund', 'amount': '20.00', 'currency': 'MAD'},
+            {'transaction_id': 'TXN-C', 'type': 'charge', 'amount': '25.00', 'currency': 'MAD'},
+            {'transaction_id': 'TXN-Z', 'type': 'charge', 'amount': '10.00', 'currency': 'MAD'},
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', newline='') as handle:
+            if name.endswith('.csv'):
+                writer = csv.DictWriter(handle, fieldnames=['transaction_id', 'type', 'amount', 'currency'])
+                writer.writeheader()
+                writer.writerows(lines)
+            else:
+                handle.writelines(json.dumps(line) + '\n' for line in lines)
+        return path
+
+    def reconcile(self, settlement):
+        output = os.path.join(self.directory.name, 'mismatches.csv')
+        report = StringIO()
+        call_command('reconcile_payments', settlement, output=output, chunk_size=2, stderr=report)
+        with open(output, newline='') as handle:
+            mismatches = {row['transaction_id']: row for row in csv.DictReader(handle)}
+        return mismatches, report.getvalue()
+
+    def test_settlement_csv_is_merge_joined(self):
+        """Test every disagreement is written out with per-currency totals"""
+        mismatches, report = self.reconcile(self.write('settlement.csv', self.lines))
+        self.assertEqual({pk: row['issue'] for pk, row in mismatches.items()}, {
+            'TXN-C': 'amount_mismatch',
+            'TXN-D': 'missing_from_settlement',
+            'TXN-Z': 'unknown_transaction',
+        })
+        self.assertEqual((mismatches['TXN-C']['expected_amount'], mismatches['TXN-C']['settled_amount']),
+                         ('30.00', '25.00'))
+        self.assertIn('MAD: expected 220.00 charged / 20.00 refunded, settled 185.00 / 20.00', report)
+        self.assertIn('2 matched, 3 mismatched', report)
+        self.assertIn('rows/s', report)
+
+    def test_refund_differences_and_ndjson(self):
+        """Test a missing refund line is reported from an NDJSON settlement"""
+        lines = [line for line in self.lines if line['type'] == 'charge']
+        mismatches, _ = self.reconcile(self.write('settlement.ndjson', lines))
+        self.assertEqual(mismatches['TXN-B']['issue'], 'refund_mismatch')
+        self.assertEqual(mismatches['TXN-B']['expected_refunded'], '20.00')
+
+    def test_unsorted_settlement_is_rejected(self):
+        """Test a settlement file out of transaction_id order fails loudly"""
+        with self.assertRaises(CommandError):
+            self.reconcile(self.write('settlement.csv', list(reversed(self.lines))))
+
+class PaymentLedgerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='ledger@test.com',
+            email='ledger@test.com',
+            password='testpassword123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.station = ChargingStation.objects.create(
+            name='Ledger Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=2,
+            available_ports=2,
+            status='active'
+        )
+
+    def reserve(self):
+        return Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=timezone.now() + timedelta(hours=1),
+            end_time=timezone.now() + timedelta(hours=3),
+            estimated_cost=125.00,
+            status='pending'
+        )
+
+    def test_charges_and_refunds_update_balances(self):
+        """Test payments and refunds append entries and keep balances current"""
+        first = self.client.post('/api/payments/', {
+            'reservation': self.reserve().id, 'amount': 125.00, 'payment_method': 'card'
+        })
+        self.client.post('/api/payments/', {
+            'reservation': self.reserve().id, 'amount': 80.00, 'payment_method': 'card'
+        })
+        self.client.post(f"/api/payments/{first.data['id']}/refund/", {'reason': 'user_cancelled'})
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/payments/summary/')
+        balance, = response.data['balances']
+        self.assertEqual(
+            (balance['charged'], balance['refunded'], balance['net'], balance['entries']),
+            ('205.00', '125.00', '80.00', 3)
+        )
+        station_balance = StationBalance.objects.get(station=self.station)
+        self.assertEqual(station_balance.net, 80)
+
+        response = self.client.get('/api/payments/statement/', {'page_size': 2})
+        self.assertEqual([entry['entry_type'] for entry in response.data['results']], ['refund', 'charge'])
+        self.assertEqual(response.data['results'][0]['amount'], '-125.00')
+        response = self.client.get(response.data['next'])
+        self.assertEqual([entry['entry_type'] for entry in response.data['results']], ['charge'])
+
+        # Refunding twice is refused and writes nothing
+        response = self.client.post(f"/api/payments/{first.data['id']}/refund/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(LedgerEntry.objects.count(), 3)
+
+        entry = LedgerEntry.objects.first()
+        entry.amount = 0
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_invalid_refunds_are_rejected(self):
+        """Test refunds with a bad amount or reason are refused before anything is written"""
+        payment = Payment.objects.create(
+            user=self.user, reservation=self.reserve(), amount=60.00, payment_method='card', status='completed'
+        )
+        for data in (
+            {'amount': -10},
+            {'amount': 0},
+            {'amount': '60.01'},
+            {'amount': 'lots'},
+            {'reason': 'changed_my_mind'},
+        ):
+            response = self.client.post(f'/api/payments/{payment.id}/refund/', data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertFalse(Refund.objects.exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+
+        response = self.client.post(f'/api/payments/{payment.id}/refund/', {'amount': '25.50'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Refund.objects.get().amount, Decimal('25.50'))
+
+    def test_refunds_are_capped_by_the_ledger_charge(self):
+        """Test payments cannot be edited and refunds never exceed the charge less earlier refunds"""
+        response = self.client.post('/api/payments/', {
+            'reservation': self.reserve().id, 'amount': 50.00, 'payment_method': 'card'
+        })
+        payment = Payment.objects.get(pk=response.data['id'])
+        url = f'/api/payments/{payment.id}/'
+        for method in (self.client.put, self.client.patch):
+            response = method(url, {'amount': 5000.00})
+            self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        # Even a payment amount changed behind the API's back cannot be over-refunded
+        Payment.objects.filter(pk=payment.pk).update(amount=5000)
+        response = self.client.post(f'{url}refund/', {'amount': 5000.00})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Refund.objects.create(payment=payment, reason='other', amount=20, status='completed')
+        response = self.client.post(f'{url}refund/', {'amount': '30.01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(f'{url}refund/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(LedgerEntry.objects.get(entry_type='refund').amount, Decimal('-30.00'))
+
+    def test_ledger_history_survives_deletes(self):
+        """Test deleting whatever ledger entries point at is refused, and reservations leave payments behind"""
+        reservation = self.reserve()
+        response = self.client.post('/api/payments/', {
+            'reservation': reservation.id, 'amount': 125.00, 'payment_method': 'card'
+        })
+        payment = Payment.objects.get(pk=response.data['id'])
+        self.client.post(f'/api/payments/{payment.id}/refund/')
+
+        for instance in (self.user, payment, payment.refunds.get(), self.station):
+            with self.assertRaises(ProtectedError):
+                instance.delete()
+        response = self.client.delete(f'/api/payments/{payment.id}/')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertTrue(Payment.objects.filter(pk=payment.pk).exists())
+
+        reservation.delete()
+        payment.refresh_from_db()
+        self.assertIsNone(payment.reservation)
+        self.assertEqual(LedgerEntry.objects.filter(payment=payment).count(), 2)
+
+    def test_backfill_and_balance_audit(self):
+        """Test past payments are backfilled once and drifted balances are fixed"""
+        payment = Payment.objects.create(
+            user=self.user, reservation=self.reserve(), amount=60.00, payment_method='card', status='refunded'
+        )
+        Refund.objects.create(payment=payment, reason='user_cancelled', amount=20.00, status='completed')
+        output = StringIO()
+        call_command('backfill_ledger', stdout=output)
+        self.assertIn('Backfilled 2 ledger entries', output.getvalue())
+        call_command('backfill_ledger', stdout=output)
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+        balance = UserBalance.objects.get(user=self.user)
+        self.assertEqual((balance.charged, balance.refunded, balance.net), (60, 20, 40))
+
+        UserBalance.objects.filter(pk=balance.pk).update(charged=0)
+        self.assertEqual(rebuild_balances(), 1)
+        balance.refresh_from_db()
+        self.assertEqual(balance.charged, 60)
+        self.assertEqual(rebuild_balances(), 0)
+
+class RevenueRollupTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='revenue@test.com',
+            email='revenue@test.com',
+            password='testpassword123'
+        )
+        self.admin = User.objects.create_superuser(username='finance-ops@test.com', password='testpassword123')
+        self.stations = [
+            ChargingStation.objects.create(
+                name=f'Revenue Station {charger_type}',
+                address='Test Address, Casablanca',
+                latitude=33.5731,
+                longitude=-7.5898,
+                charger_type=charger_type,
+                power_rating=22,
+                price_per_kwh=2.50,
+                total_ports=4,
+                available_ports=4,
+                status='active'
+            )
+            for charger_type in ('type2', 'ccs')
+        ]
+
+    def pay(self, station, amount, method='card'):
+        reservation = Reservation.objects.create(
+            user=self.user,
+            station=station,
+            start_time=timezone.now() + timedelta(hours=1),
+            end_time=timezone.now() + timedelta(hours=3),
+            estimated_cost=amount,
+            status='pending'
+        )
+        self.client.force_authenticate(user=self.user)
+        return self.client.post('/api/payments/', {
+            'reservation': reservation.id, 'amount': amount, 'payment_method': method
+        }).data['id']
+
+    def test_ledger_is_folded_once_into_daily_rollups(self):
+        """Test each ledger entry is counted once, after the settle delay"""
+        first = self.pay(self.stations[0], 100.00)
+        self.pay(self.stations[1], 40.00, method='mobile')
+        self.client.post(f'/api/payments/{first}/refund/', {'amount': 30.00})
+
+        self.assertEqual(refresh_revenue()['folded'], 0)  # too recent
+        later = timezone.now() + timedelta(minutes=5)
+        self.assertEqual(refresh_revenue(batch_size=2, now=later)['folded'], 3)
+        self.assertEqual(refresh_revenue(now=later)['folded'], 0)
+
+        self.pay(self.stations[0], 25.00)
+        self.assertEqual(refresh_revenue(now=timezone.now() + timedelta(minutes=5))['folded'], 1)
+
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/payments/analytics/', {'group': 'charger_type'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        by_type = {row['charger_type']: row for row in response.data['series']}
+        self.assertEqual(
+            (by_type['type2']['gross'], by_type['type2']['refunded'], by_type['type2']['net'], by_type['type2']['charges']),
+            (125, 30, 95, 2)
+        )
+        self.assertEqual(by_type['ccs']['net'], 40)
+
+        response = self.client.get('/api/payments/analytics/', {'group': 'payment_method', 'interval': 'month'})
+        self.assertEqual({row['payment_method']: row['net'] for row in response.data['series']},
+                         {'card': 95, 'mobile': 40})
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/payments/analytics/').status_code, status.HTTP_403_FORBIDDEN)
+
+class FlakyGateway(LocalGateway):
+    """Instant gateway replaying scripted outcomes before approving"""
+    def __init__(self, *outcomes):
+        super().__init__(latency=(0, 0), failure_rate=0, decline_rate=0)
+        self.outcomes = list(outcomes)
+
+    def charge(self, amount, currency, payment_method, idempotency_key):
+        if self.outcomes:
+            raise self.outcomes.pop(0)
+        return super().charge(amount, currency, payment_method, idempotency_key)
+
+class PaymentGatewayTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='gateway@test.com',
+            email='gateway@test.com',
+            password='testpassword123'
+        )
+        self.station = ChargingStation.objects.create(
+            name='Gateway Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=2,
+            available_ports=2,
+            status='active'
+        )
+        self.reservation = Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=timezone.now() + timedelta(hours=1),
+            end_time=timezone.now() + timedelta(hours=3),
+            estimated_cost=125.00,
+            status='pending'
+        )
+        self.payment = Payment.objects.create(
+            user=self.user,
+            reservation=self.reservation,
+            amount=125.00,
+            payment_method='card',
+            status='processing',
+            next_attempt_at=timezone.now()
+        )
+
+    def test_gateway_errors_are_retried_with_backoff(self):
+        """Test a gateway error leaves the payment queued for a later attempt"""
+        gateway = FlakyGateway(GatewayError('timeout'))
+        self.assertEqual(claim_payments(10), [self.payment.pk])
+        self.assertEqual(claim_payments(10), [])  # leased
+
+        self.assertEqual(charge_payment(self.payment.pk, gateway), 'processing')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.attempts, 1)
+        self.assertGreater(self.payment.next_attempt_at, timezone.now())
+        self.assertEqual(self.payment.payment_gateway_response['error'], 'timeout')
+
+        self.assertEqual(claim_payments(10, now=self.payment.next_attempt_at), [self.payment.pk])
+        self.assertEqual(charge_payment(self.payment.pk, gateway), 'completed')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_gateway_response['status'], 'approved')
+        self.assertIsNone(self.payment.next_attempt_at)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'confirmed')
+
+    def test_declined_payment_fails_without_confirming(self):
+        """Test a decline fails the payment and leaves the reservation pending"""
+        gateway = FlakyGateway(GatewayDeclined({'status': 'declined', 'reason': 'insufficient_funds'}))
+        claim_payments(10)
+        self.assertEqual(charge_payment(self.payment.pk, gateway), 'failed')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'failed')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'pending')
+
+    def test_station_refund_during_charge_refunds_the_charge(self):
+        """Test a booking cancelled while its payment is charged ends up refunded"""
+        station_id = self.station.pk
+
+        class CancellingGateway(FlakyGateway):
+            def charge(self, *args):
+                # The operator reports the station defective mid-charge
+                refund_station(station_id)
+                return super().charge(*args)
+
+        claim_payments(10)
+        self.assertEqual(charge_payment(self.payment.pk, CancellingGateway()), 'refunded')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'cancelled')
+        refund = Refund.objects.get(payment=self.payment)
+        self.assertEqual(refund.amount, self.payment.amount)
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(payment=self.payment).values_list('entry_type', flat=True)),
+            ['charge', 'refund']
+        )
+        self.assertEqual(UserBalance.objects.get(user=self.user).net, 0)
+
+    def test_payment_queued_for_cancelled_booking_is_voided(self):
+        """Test a queued payment is not charged once its booking was cancelled"""
+        refund_station(self.station.pk)
+        gateway = FlakyGateway()
+        claim_payments(10)
+        self.assertEqual(charge_payment(self.payment.pk, gateway), 'failed')
+        self.assertEqual(gateway._charges, {})
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_gateway_response['status'], 'voided')
+        self.assertFalse(LedgerEntry.objects.exists())
+
+class PaymentProcessorTestCase(TransactionTestCase):
+    """Payments charged by worker threads, each with its own connection"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='queue@test.com',
+            email='queue@test.com',
+            password='testpassword123'
+        )
+        self.station = ChargingStation.objects.create(
+            name='Queue Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=10,
+            available_ports=10,
+            status='active'
+        )
+
+    @override_settings(PAYMENTS={'EAGER': False})
+    def test_payments_are_queued_and_charged_by_the_pool(self):
+        """Test POST returns while processing and the pool confirms reservations"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        base = timezone.now() + timedelta(days=1)
+        reservations = [
+            Reservation.objects.create(
+                user=self.user,
+                station=self.station,
+                start_time=base + timedelta(hours=i),
+                end_time=base + timedelta(hours=i, minutes=30),
+                estimated_cost=20.00,
+                status='pending'
+            )
+            for i in range(6)
+        ]
+        for reservation in reservations:
+            response = client.post('/api/payments/', {
+                'reservation': reservation.id,
+                'amount': 20.00,
+                'payment_method': 'card'
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['status'], 'processing')
+        self.assertFalse(Reservation.objects.filter(status='confirmed').exists())
+
+        processed = []
+        processor = PaymentProcessor(
+            workers=3,
+            poll=0.01,
+            gateway=LocalGateway(latency=(0.01, 0.02), failure_rate=0, decline_rate=0),
+            on_processed=lambda payment_id, outcome: processed.append(outcome),
+        )
+        processor.run(once=True)
+
+        self.assertEqual(processed, ['completed'] * 6)
+        self.assertEqual(Payment.objects.filter(status='completed').count(), 6)
+        self.assertEqual(Reservation.objects.filter(status='confirmed').count(), 6)
+
+class ConcurrentBookingTestCase(TransactionTestCase):
+    """Bookings race from separate threads, each with its own connection"""
+    THREADS = 12
+    # Lock retries per request before a 500 counts as a real failure
+    LOCK_RETRIES = 50
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='race@test.com',
+            email='race@test.com',
+            password='testpassword123'
+        )
+        self.station = ChargingStation.objects.create(
+            name='Contended Station',
+            address='Test Address, Casablanca',
+            latitude=33.5731,
+            longitude=-7.5898,
+            charger_type='type2',
+            power_rating=22,
+            price_per_kwh=2.50,
+            total_ports=3,
+            available_ports=3,
+            status='active'
+        )
+        self.base = timezone.now() + timedelta(days=1)
+
+    def race(self, action):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        errors = []
+
+        def worker(index):
+            # The test client re-raises view errors via a global signal, which
+            # would leak between threads; look at the status code instead
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                response = action(client, index)
+                retries = 0
+                while response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR and retries < self.LOCK_RETRIES:
+                    # SQLite's test database locks whole tables; retry like a
+                    # client would after a lock timeout
+                    retries += 1
+                    time.sleep(0.01)
+                    response = action(client, index)
+                if response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR:
+                    errors.append(response.content.decode(errors='replace'))
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [], f'requests still failing after {self.LOCK_RETRIES} retries')
+        return results
+
+    def test_concurrent_bookings_never_overbook(self):
+        """Test parallel bookings claim at most total_ports ports"""
+        def book(client, index):
+            # Disjoint windows, so only the port counter limits bookings
+            start = self.base + timedelta(hours=3 * index)
+            return client.post('/api/reservations/', {
+                'station': self.station.id,
+                'start_time': start.isoformat(),
+                'end_time': (start + timedelta(hours=2)).isoformat(),
+                'estimated_cost': 50.00
+            })
+
+        results = self.race(book)
+        created = results.count(status.HTTP_201_CREATED)
+        self.assertEqual(created, 3)
+        self.assertEqual(results.count(status.HTTP_400_BAD_REQUEST), self.THREADS - 3)
+
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.available_ports, 0)
+        self.assertEqual(Reservation.objects.filter(station=self.station).count(), created)
+
+    def test_concurrent_cancels_release_one_port(self):
+        """Test cancelling the same reservation in parallel frees a single port"""
+        reservation = Reservation.objects.create(
+            user=self.user,
+            station=self.station,
+            start_time=self.base,
+            end_time=self.base + timedelta(hours=2),
+            estimated_cost=50.00,
+            status='confirmed'
+        )
+        ChargingStation.objects.filter(pk=self.station.pk).update(available_ports=1)
+
+        results = self.race(lambda client, index: client.post(f'/api/reservations/{reservation.id}/cancel/'))
+        self.assertEqual(results.count(status.HTTP_200_OK), 1)
+
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.available_ports, 2)
+
+    def test_concurrent_retries_book_once(self):
+        """Test parallel retries sharing an idempotency key create one reservation"""
+        start = self.base
+        data = {
+            'station': self.station.id,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=2)).isoformat(),
+            'estimated_cost': 50.00
+        }
+        results = self.race(lambda client, index: client.post('/api/reservations/', data,
+                                                              HTTP_IDEMPOTENCY_KEY='retry-storm'))
+        self.assertIn(status.HTTP_201_CREATED, results)
+        self.assertEqual(set(results) - {status.HTTP_201_CREATED, status.HTTP_409_CONFLICT}, set())
+
+        self.assertEqual(Reservation.objects.filter(station=self.station).count(), 1)
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.available_ports, 2)
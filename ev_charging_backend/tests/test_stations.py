@@ -0,0 +1,531 @@
+# tests/test_stations.py - Station catalog and lookup testing
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework import status
+from ev_charging_backend.renderers import ORJSONRenderer
+import stations
+from stations.broadcast import availability_message, broadcaster, publish_availability
+from stations.catalog import CATALOG_VERSION_KEY
+from stations.checks import check_shared_cache
+from stations.clusters import MAX_ZOOM, tiles_for_bbox
+from stations.geo import covering_cells, encode_geohash, haversine_km
+from stations.locator import station_locator
+from stations.models import ChargingStation, StationReview
+from stations.serializers import RECENT_REVIEWS_LIMIT
+from reservations.models import Reservation
+from payments.models import LedgerEntry, Payment, Refund, StationBalance
+
+def make_station(name, latitude, longitude, **extra):
+    data = {
+        'name': name,
+        'address': f'{name}, Casablanca',
+        'latitude': latitude,
+        'longitude': longitude,
+        'charger_type': 'type2',
+        'power_rating': 22,
+        'price_per_kwh': 2.50,
+        'total_ports': 4,
+        'available_ports': 4,
+        'status': 'active',
+    }
+    data.update(extra)
+    return ChargingStation.objects.create(**data)
+
+class NearbyStationsTestCase(APITestCase):
+    def setUp(self):
+        # Casablanca city centre and points at increasing distances
+        self.center = make_station('Center', 33.5731, -7.5898)
+        self.maarif = make_station('Maarif', 33.5845, -7.6098)
+        self.morocco_mall = make_station('Morocco Mall', 33.5888, -7.6946)
+        self.rabat = make_station('Rabat', 34.0209, -6.8416)
+        self.offline = make_station('Offline', 33.5740, -7.5900, status='offline')
+
+    def test_geohash_kept_in_sync_on_save(self):
+        """Test the spatial index follows coordinate changes"""
+        self.assertEqual(self.center.geohash, encode_geohash(33.5731, -7.5898))
+        self.center.latitude = 34.0209
+        self.center.longitude = -6.8416
+        self.center.save(update_fields=['latitude', 'longitude'])
+        self.center.refresh_from_db()
+        self.assertEqual(self.center.geohash, self.rabat.geohash)
+
+    def test_covering_cells_contain_every_point_in_radius(self):
+        """Test the cell cover never misses a station inside the circle"""
+        radius = 12
+        cells = covering_cells(33.5731, -7.5898, radius)
+        for station in [self.center, self.maarif, self.morocco_mall]:
+            distance = haversine_km(33.5731, -7.5898, station.latitude, station.longitude)
+            if distance <= radius:
+                self.assertTrue(any(station.geohash.startswith(c) for c in cells))
+
+    def test_nearby_filters_by_true_distance_and_sorts(self):
+        """Test nearby returns only active stations within radius, closest first"""
+        response = self.client.get('/api/stations/nearby/', {
+            'lat': 33.5731, 'lng': -7.5898, 'radius': 15
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [s['name'] for s in response.data]
+        self.assertEqual(names, ['Center', 'Maarif', 'Morocco Mall'])
+        distances = [s['distance'] for s in response.data]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_nearby_limit_returns_k_nearest(self):
+        """Test limit keeps only the k closest stations"""
+        response = self.client.get('/api/stations/nearby/', {
+            'lat': 33.5731, 'lng': -7.5898, 'radius': 200, 'limit': 2
+        })
+        self.assertEqual([s['name'] for s in response.data], ['Center', 'Maarif'])
+
+    def test_nearby_rejects_invalid_parameters(self):
+        """Test malformed coordinates are rejected"""
+        response = self.client.get('/api/stations/nearby/', {'lat': 'abc', 'lng': -7.5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class StationLocatorTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        station_locator.reset()
+        self.center = make_station('Center', 33.5731, -7.5898)
+        self.maarif = make_station('Maarif', 33.5845, -7.6098, charger_type='ccs')
+        self.rabat = make_station('Rabat', 34.0209, -6.8416)
+
+    def test_map_is_served_without_sql(self):
+        """Test map queries hit the in-memory snapshot once it is loaded"""
+        station_locator.reload()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/stations/map/', {
+                'lat': 33.5731, 'lng': -7.5898, 'radius': 10
+            })
+        self.assertEqual([s['name'] for s in response.data], ['Center', 'Maarif'])
+        self.assertEqual(response.data[0]['distance'], 0.0)
+
+    def test_k_nearest_and_charger_filter(self):
+        """Test limit and charger_type filters on the locator"""
+        nearest = station_locator.query(latitude=34.0, longitude=-6.9, limit=1)
+        self.assertEqual([s['id'] for s in nearest], [self.rabat.id])
+        ccs = station_locator.query(charger_type='ccs')
+        self.assertEqual([s['id'] for s in ccs], [self.maarif.id])
+
+    def test_signals_patch_snapshot_incrementally(self):
+        """Test saves and deletes are applied without a full reload"""
+        station_locator.reload()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.center.available_ports = 1
+            self.center.save()
+            self.rabat.delete()
+        with self.assertNumQueries(0):
+            stations = {s['name']: s for s in station_locator.query()}
+        self.assertEqual(stations['Center']['available_ports'], 1)
+        self.assertNotIn('Rabat', stations)
+
+class StationRatingsTestCase(APITestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'reviewer{i}@test.com', password='testpassword123')
+            for i in range(RECENT_REVIEWS_LIMIT + 2)
+        ]
+        self.stations = [make_station(f'Station {i}', 33.57 + i / 100, -7.59) for i in range(3)]
+
+    def test_add_review_updates_counters(self):
+        """Test add_review maintains the denormalized rating aggregates"""
+        station = self.stations[0]
+        for user, rating in zip(self.users[:2], [5, 2]):
+            self.client.force_authenticate(user=user)
+            response = self.client.post(f'/api/stations/{station.id}/add_review/', {
+                'station': station.id, 'rating': rating, 'comment': 'ok'
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        station.refresh_from_db()
+        self.assertEqual((station.rating_sum, station.rating_count), (7, 2))
+        self.assertEqual(station.average_rating, 3.5)
+
+    def test_edited_and_deleted_reviews_update_counters(self):
+        """Test changing a review's rating applies the difference to the station counters"""
+        station = self.stations[0]
+        review = StationReview.objects.create(station=station, user=self.users[0], rating=5)
+        StationReview.objects.create(station=station, user=self.users[1], rating=3)
+        review.rating = 1
+        review.save()
+        review.comment = 'edited'
+        review.save(update_fields=['comment'])
+        station.refresh_from_db()
+        self.assertEqual((station.rating_sum, station.rating_count), (4, 2))
+
+        review.delete()
+        station.refresh_from_db()
+        self.assertEqual((station.rating_sum, station.rating_count), (3, 1))
+
+    def test_list_query_count_is_constant(self):
+        """Test station list cost does not grow with stations or reviews"""
+        for station in self.stations:
+            for user in self.users:
+                StationReview.objects.create(station=station, user=user, rating=4)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/stations/')
+        self.assertEqual(len(response.data['results']), 3)
+        for station in response.data['results']:
+            self.assertEqual(len(station['recent_reviews']), RECENT_REVIEWS_LIMIT)
+
+class StationListingTestCase(APITestCase):
+    def setUp(self):
+        self.stations = [make_station(f'Station {i}', 33.57 + i / 100, -7.59) for i in range(5)]
+
+    def test_cursor_pagination_walks_every_station_once(self):
+        """Test following next links returns each station exactly once in order"""
+        seen = []
+        url = '/api/stations/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(s['id'] for s in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [s.id for s in self.stations])
+
+    def test_sparse_fieldset(self):
+        """Test ?fields= trims both the payload and the loaded columns"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/stations/', {
+                'fields': 'id,latitude,longitude,status,available_ports'
+            })
+        first = response.data['results'][0]
+        self.assertEqual(set(first), {'id', 'latitude', 'longitude', 'status', 'available_ports'})
+
+    def test_sparse_fieldset_rejects_unknown_fields(self):
+        """Test unknown field names are reported"""
+        response = self.client.get('/api/stations/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CatalogConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.station = make_station('Center', 33.5731, -7.5898)
+
+    def test_matching_etag_returns_304_without_queries(self):
+        """Test If-None-Match short-circuits before serialization"""
+        response = self.client.get('/api/stations/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/stations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_when_a_station_changes(self):
+        """Test a station save invalidates previously issued ETags"""
+        url = f'/api/stations/{self.station.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.station.available_ports = 0
+            self.station.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['available_ports'], 0)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_bumped_by_another_worker_invalidates_etags(self):
+        """Test a bump made through another process's cache connection is seen here"""
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            etag = self.client.get('/api/stations/')['ETag']
+            other_worker = caches.create_connection('default')
+            other_worker.incr(CATALOG_VERSION_KEY)
+            response = self.client.get('/api/stations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deploy_check_rejects_process_local_cache(self):
+        """Test check --deploy reports a default cache other workers cannot see"""
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+        with override_settings(CACHES=local):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['stations.E001'])
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+
+class AvailabilityBroadcastTestCase(APITestCase):
+    def test_deltas_are_coalesced_and_filtered_by_bbox(self):
+        """Test subscribers get the latest delta per station inside their bbox"""
+        center = make_station('Center', 33.5731, -7.5898)
+        rabat = make_station('Rabat', 34.0209, -6.8416)
+
+        async def scenario():
+            subscription = broadcaster.subscribe(bbox=(-7.7, 33.5, -7.5, 33.7))
+            try:
+                def publish_from_worker_thread():
+                    for ports in [3, 2, 1]:
+                        center.available_ports = ports
+                        publish_availability(availability_message(center))
+                    publish_availability(availability_message(rabat))
+                thread = threading.Thread(target=publish_from_worker_thread)
+                thread.start()
+                thread.join()
+                return await subscription.next_batch(timeout=1)
+            finally:
+                broadcaster.unsubscribe(subscription)
+
+        batch = asyncio.run(scenario())
+        self.assertEqual(batch, [{'station_id': center.id, 'available_ports': 1, 'status': 'active'}])
+
+    def test_stream_rejects_malformed_bbox(self):
+        """Test the SSE endpoint validates its bbox filter"""
+        response = self.client.get('/api/stations/stream/', {'bbox': '1,2,3'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class StationClustersTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        station_locator.reset()
+        make_station('Center', 33.5731, -7.5898, available_ports=3)
+        make_station('Center CCS', 33.5735, -7.5895, charger_type='ccs', available_ports=2)
+        make_station('Center Offline', 33.5733, -7.5896, status='offline', available_ports=4)
+        self.rabat = make_station('Rabat', 34.0209, -6.8416)
+
+    def test_city_zoom_groups_nearby_stations(self):
+        """Test nearby stations collapse into one cluster with per-type totals"""
+        response = self.client.get('/api/stations/clusters/', {
+            'bbox': '-8.0,33.0,-6.5,34.5', 'zoom': 8
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        clusters = sorted(response.data['clusters'], key=lambda c: c['count'])
+        self.assertEqual([c['count'] for c in clusters], [1, 3])
+        self.assertEqual(clusters[0]['station_id'], self.rabat.id)
+        casablanca = clusters[1]
+        self.assertEqual(casablanca['available_ports'], 5)
+        self.assertEqual(casablanca['by_charger_type'], {
+            'type2': {'count': 2, 'available_ports': 3},
+            'ccs': {'count': 1, 'available_ports': 2},
+        })
+
+    def test_clusters_reject_oversized_viewport(self):
+        """Test the tile cap keeps responses bounded"""
+        response = self.client.get('/api/stations/clusters/', {
+            'bbox': '-17,21,-1,36', 'zoom': 14
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_huge_viewport_is_rejected_before_building_tiles(self):
+        """Test a world-sized bbox at max zoom is refused without enumerating tiles"""
+        with mock.patch('stations.clusters._build_tile_clusters') as build, self.assertNumQueries(0):
+            response = self.client.get('/api/stations/clusters/', {
+                'bbox': '-180,-85,180,85', 'zoom': MAX_ZOOM
+            })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        build.assert_not_called()
+        with self.assertRaises(ValueError):
+            tiles_for_bbox((-180, -85, 180, 85), MAX_ZOOM)
+
+class ImportStationsTestCase(APITestCase):
+    def run_import(self, content, suffix):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        out = io.StringIO()
+        call_command('import_stations', handle.name, '--chunk-size', '2', stdout=out)
+        return out.getvalue()
+
+    def test_json_import_upserts_on_external_id(self):
+        """Test streamed JSON rows are validated and upserted by external_id"""
+        rows = [
+            {'external_id': 'op-1', 'name': 'A', 'latitude': 33.5, 'longitude': -7.6,
+             'charger_type': 'CCS', 'power_rating': 50, 'price_per_kwh': '3.1', 'total_ports': 2},
+            {'external_id': 'op-2', 'name': 'B', 'latitude': 133.5, 'longitude': -7.6,
+             'charger_type': 'ccs', 'power_rating': 50, 'price_per_kwh': 3},
+            {'external_id': 'op-3', 'name': 'C', 'latitude': 33.6, 'longitude': -7.5,
+             'charger_type': 'warp', 'power_rating': 50, 'price_per_kwh': 3},
+        ]
+        output = self.run_import(json.dumps(rows), '.json')
+        self.assertIn('1 stations', output)
+        self.assertIn('2 rejected', output)
+
+        station = ChargingStation.objects.get(external_id='op-1')
+        station.available_ports = 0
+        station.save()
+
+        rows = [{'external_id': 'op-1', 'name': 'A renamed', 'latitude': 33.51, 'longitude': -7.6,
+                 'charger_type': 'type2', 'power_rating': 22, 'price_per_kwh': 2, 'total_ports': 3}]
+        self.run_import('\n'.join(json.dumps(row) for row in rows), '.ndjson')
+
+        station.refresh_from_db()
+        self.assertEqual(ChargingStation.objects.count(), 1)
+        self.assertEqual((station.name, station.charger_type, station.total_ports), ('A renamed', 'type2', 3))
+        self.assertEqual(station.available_ports, 0)  # Live counter untouched
+        self.assertEqual(station.geohash, encode_geohash(33.51, -7.6))
+
+    def test_shrinking_total_ports_clamps_available_ports(self):
+        """Test a re-import with fewer ports never leaves more of them free than exist"""
+        row = {'external_id': 'op-1', 'name': 'A', 'latitude': 33.5, 'longitude': -7.6,
+               'charger_type': 'ccs', 'power_rating': 50, 'price_per_kwh': 3, 'total_ports': 4}
+        self.run_import(json.dumps([row]), '.json')
+        self.run_import(json.dumps([{**row, 'total_ports': 2}]), '.json')
+        station = ChargingStation.objects.get(external_id='op-1')
+        self.assertEqual((station.total_ports, station.available_ports), (2, 2))
+
+    def test_casablanca_seed_data_imports_cleanly(self):
+        """Test the bundled Casablanca stations load through import_stations"""
+        out = io.StringIO()
+        path = os.path.join(os.path.dirname(stations.__file__), 'data', 'casablanca_stations.json')
+        call_command('import_stations', path, stdout=out)
+        self.assertIn('0 rejected', out.getvalue())
+        self.assertEqual(ChargingStation.objects.count(), 8)
+        call_command('import_stations', path, stdout=out)
+        self.assertEqual(ChargingStation.objects.count(), 8)
+
+    def test_csv_import(self):
+        """Test CSV input including ';' separated amenities"""
+        content = (
+            'external_id,name,address,latitude,longitude,charger_type,power_rating,price_per_kwh,total_ports,amenities\n'
+            'csv-1,Mall,Casablanca,33.5888,-7.6946,type2,22,2.50,6,parking;wifi\n'
+            'csv-2,Port,Casablanca,33.5956,-7.6231,chademo,40,2.80,3,\n'
+        )
+        self.run_import(content, '.csv')
+        mall = ChargingStation.objects.get(external_id='csv-1')
+        self.assertEqual(mall.amenities, ['parking', 'wifi'])
+        self.assertEqual(ChargingStation.objects.count(), 2)
+
+class RendererTestCase(APITestCase):
+    def setUp(self):
+        self.station = make_station('Center', 33.5731, -7.5898)
+
+    def test_orjson_matches_stdlib_output(self):
+        """Test the fast renderer produces the same document as DRF's default"""
+        data = self.client.get(f'/api/stations/{self.station.id}/').data
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    @skipUnless(find_spec('msgpack'), 'msgpack is not installed')
+    def test_messagepack_negotiation(self):
+        """Test clients can ask for the compact binary encoding"""
+        import msgpack
+
+        response = self.client.get('/api/stations/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        body = msgpack.unpackb(response.content)
+        self.assertEqual(body['results'][0]['name'], 'Center')
+        self.assertEqual(body['results'][0]['latitude'], '33.57310000')
+
+class ReconcilePortsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver@test.com', password='testpassword123')
+        self.admin = User.objects.create_superuser(username='admin@test.com', password='testpassword123')
+        self.busy = make_station('Busy', 33.5731, -7.5898, available_ports=4)
+        self.full = make_station('Full', 33.58, -7.59, total_ports=2, available_ports=1)
+        self.correct = make_station('Correct', 33.59, -7.60, available_ports=3)
+        start = timezone.now() + timedelta(hours=1)
+        for station, held in ((self.busy, 2), (self.full, 3), (self.correct, 1)):
+            for _ in range(held):
+                Reservation.objects.create(
+                    user=self.user, station=station, start_time=start,
+                    end_time=start + timedelta(hours=1), estimated_cost=50, status='confirmed'
+                )
+        Reservation.objects.create(
+            user=self.user, station=self.correct, start_time=start,
+            end_time=start + timedelta(hours=1), estimated_cost=50, status='cancelled'
+        )
+
+    def test_only_drifted_stations_are_fixed(self):
+        """Test free ports are recomputed from blocking reservations"""
+        output = io.StringIO()
+        call_command('reconcile_ports', stdout=output)
+        self.assertIn('fixed 2', output.getvalue())
+
+        ports = dict(ChargingStation.objects.values_list('name', 'available_ports'))
+        self.assertEqual(ports, {'Busy': 2, 'Full': 0, 'Correct': 3})
+
+    def test_api_hook_reports_drift_to_admins(self):
+        """Test the admin endpoint returns drift metrics, with a dry-run mode"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/stations/reconcile-ports/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/stations/reconcile-ports/', {'dry_run': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stations'], 3)
+        self.assertEqual(response.data['drifted'], 2)
+        self.assertEqual(response.data['ports_overcounted'], 3)
+        self.assertEqual(response.data['max_drift'], 2)
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.available_ports, 4)
+
+class DefectiveStationRefundTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver@test.com', password='testpassword123')
+        self.admin = User.objects.create_superuser(username='support@test.com', password='testpassword123')
+        self.station = make_station('Broken', 33.5731, -7.5898, available_ports=1)
+        self.other = make_station('Fine', 33.58, -7.59)
+        start = timezone.now() + timedelta(hours=1)
+
+        def book(station, reservation_status, payment_status=None):
+            reservation = Reservation.objects.create(
+                user=self.user, station=station, start_time=start,
+                end_time=start + timedelta(hours=1), estimated_cost=50, status=reservation_status
+            )
+            if payment_status:
+                Payment.objects.create(user=self.user, reservation=reservation, amount=50,
+                                       payment_method='card', status=payment_status)
+            return reservation
+
+        self.paid = [book(self.station, 'confirmed', 'completed') for _ in range(2)]
+        self.unpaid = book(self.station, 'pending')
+        self.charging = book(self.station, 'active', 'completed')
+        self.elsewhere = book(self.other, 'confirmed', 'completed')
+
+    def test_upcoming_bookings_are_cancelled_and_refunded(self):
+        """Test reporting a station defective refunds its upcoming bookings in bulk"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(f'/api/stations/{self.station.id}/report_defective/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['cancelled'], response.data['refunded']), (3, 2))
+        self.assertEqual(response.data['refunded_amount'], '100.00')
+
+        statuses = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[r.id] for r in self.paid + [self.unpaid]], ['cancelled'] * 3)
+        self.assertEqual(statuses[self.charging.id], 'active')
+        self.assertEqual(statuses[self.elsewhere.id], 'confirmed')
+
+        refunds = Refund.objects.filter(payment__reservation__in=self.paid)
+        self.assertEqual(refunds.count(), 2)
+        self.assertTrue(all(refund.reason == 'station_defective' for refund in refunds))
+        self.assertEqual(Payment.objects.filter(status='refunded').count(), 2)
+        self.assertEqual(LedgerEntry.objects.filter(entry_type='refund').count(), 2)
+        self.assertEqual(StationBalance.objects.get(station=self.station).refunded, 100)
+
+        self.station.refresh_from_db()
+        self.assertEqual((self.station.status, self.station.available_ports), ('defective', 4))
+
+    def test_drivers_cannot_report_a_station_defective(self):
+        """Test non-staff users get 403 and nobody's booking is cancelled"""
+        stranger = User.objects.create_user(username='stranger@test.com', password='testpassword123')
+        self.client.force_authenticate(user=stranger)
+        response = self.client.post(f'/api/stations/{self.station.id}/report_defective/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Reservation.objects.filter(status='cancelled').exists())
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.status, 'active')
+
+    def test_command_reports_progress_per_batch(self):
+        """Test the command refunds in batches and reports each one"""
+        output = io.StringIO()
+        call_command('report_defective', str(self.station.id), batch_size=2, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[:2], [
+            '2 reservations cancelled, 2 payments refunded',
+            '3 reservations cancelled, 2 payments refunded',
+        ])
+        self.assertIn('cancelled 3 reservations, refunded 2 payments (100.00)', lines[-1])
+        self.assertEqual(Refund.objects.count(), 2)